@@ -0,0 +1,73 @@
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, update, union_all, literal
+import models
+from models import AsyncSession, Todo, ArchivedTodo, TodoStatus
+from config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, VACUUM_PAGES
+
+logger = logging.getLogger(__name__)
+
+FINISHED = [TodoStatus.DONE, TodoStatus.CLOSED, TodoStatus.FAILED]
+ARCHIVED_COLUMNS = ['id', 'user_id', 'text', 'importance', 'deadline', 'reminder_minutes', 'status',
+                    'is_recurring', 'recurrence_pattern', 'recurrence_interval', 'parent_id']
+HISTORY_COLUMNS = ['id', 'user_id', 'text', 'importance', 'deadline', 'reminder_minutes', 'status']
+
+# Finished todos from both tables; filters on it are pushed into each half of the UNION ALL
+todo_history = union_all(
+    select(*[getattr(Todo, name) for name in HISTORY_COLUMNS]).where(Todo.status.in_(FINISHED)),
+    select(*[getattr(ArchivedTodo, name) for name in HISTORY_COLUMNS]),
+).subquery('history')
+
+
+async def archive_finished_todos(max_age: timedelta = timedelta(days=ARCHIVE_AFTER_DAYS),
+                                 batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Move finished todos whose deadline is older than `max_age` into todo_archive.
+
+    Each batch is copied and deleted in its own short transaction, so the
+    write lock is never held for long. Returns the number of rows moved.
+    """
+    before = datetime.now() - max_age
+    moved = 0
+    while True:
+        async with AsyncSession() as session:
+            ids = (await session.scalars(
+                select(Todo.id)
+                .where(Todo.status.in_(FINISHED), Todo.deadline < before)
+                .order_by(Todo.id)
+                .limit(batch_size)
+            )).all()
+            if not ids:
+                return moved
+
+            archived_at = datetime.utcnow()
+            await session.execute(insert(ArchivedTodo).from_select(
+                ARCHIVED_COLUMNS + ['archived_at'],
+                select(*[getattr(Todo, name) for name in ARCHIVED_COLUMNS], literal(archived_at))
+                .where(Todo.id.in_(ids))
+            ))
+            # Recurring successors may still point at an archived parent
+            await session.execute(update(Todo).where(Todo.parent_id.in_(ids)).values(parent_id=None))
+            await session.execute(delete(Todo).where(Todo.id.in_(ids)))
+            await session.commit()
+        moved += len(ids)
+        if len(ids) < batch_size:
+            return moved
+
+
+async def incremental_vacuum(pages: int = VACUUM_PAGES):
+    """Return free SQLite pages to the OS; PostgreSQL's autovacuum needs no help."""
+    if models.async_engine.dialect.name != 'sqlite':
+        return
+    async with models.async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        mode = (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar()
+        if mode != 2:
+            # Databases created before archiving need one full VACUUM to switch modes
+            logger.info("Converting database to incremental auto_vacuum")
+            await conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            await conn.exec_driver_sql("VACUUM")
+            return
+        pragma = f"PRAGMA incremental_vacuum({int(pages)});" if pages else "PRAGMA incremental_vacuum;"
+        # SQLite frees one page per step and a plain execute steps once; executescript runs it to the end
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.executescript(pragma)
@@ -0,0 +1,178 @@
+"""Local stand-in for the Telegram Bot API, used by the load test.
+
+Implements the methods the bot calls (getMe, getUpdates, sendMessage,
+editMessageText, editMessageReplyMarkup, answerCallbackQuery, setMyCommands,
+deleteWebhook) over plain HTTP/1.1, with configurable response latency and a
+share of sending calls answered with 429 Too Many Requests. Point the bot at
+it with BOT_API_URL=http://127.0.0.1:<port>.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from urllib.parse import parse_qsl
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'LoadTest', 'username': 'load_test_bot'}
+# Calls that count against Telegram's flood limits and may be answered with 429
+RATE_LIMITED_METHODS = ('sendMessage', 'editMessageText', 'editMessageReplyMarkup', 'answerCallbackQuery')
+REASONS = {200: 'OK', 404: 'Not Found', 429: 'Too Many Requests'}
+
+
+class FakeBotApi:
+    """Bot API server that queues simulated updates and reports every reply to a callback.
+
+    `on_reply(user_id, method, params)` is called for each sending call; the
+    user is the target chat, or the sender of the answered callback query.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 rate_limit_ratio: float = 0.0, retry_after: int = 1, on_reply=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.on_reply = on_reply
+        self.calls = Counter()
+        self.rate_limited = Counter()
+        self.polling = asyncio.Event()
+        self._server = None
+        self._connections = {}
+        self._pending = []
+        self._has_updates = asyncio.Event()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        self._callback_users = {}
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # Wake pending long polls and drop idle keep-alive connections
+            self._has_updates.set()
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    def send_text(self, user_id: int, text: str):
+        message = self._message(user_id, text, sender={'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'})
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        self._push({'message': message})
+
+    def tap(self, user_id: int, message_id: int, data: str):
+        query_id = str(next(self._update_ids))
+        self._callback_users[query_id] = user_id
+        message = self._message(user_id, 'keyboard', message_id=message_id)
+        self._push({'callback_query': {
+            'id': query_id,
+            'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'},
+            'chat_instance': str(user_id),
+            'message': message,
+            'data': data,
+        }})
+
+    def _push(self, update: dict):
+        update['update_id'] = next(self._update_ids)
+        self._pending.append(update)
+        self._has_updates.set()
+
+    def _message(self, chat_id: int, text: str, sender: dict = BOT_USER, message_id: int = None) -> dict:
+        return {
+            'message_id': message_id or next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': sender,
+            'text': text,
+        }
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                _, target, _ = lines[0].split(' ', 2)
+                headers = dict(
+                    (name.strip().lower(), value.strip())
+                    for name, value in (line.split(':', 1) for line in lines[1:] if ':' in line)
+                )
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+                status, payload = await self._call(target.rsplit('/', 1)[-1], dict(parse_qsl(body.decode())))
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def _call(self, method: str, params: dict) -> tuple:
+        self.calls[method] += 1
+        if method == 'getUpdates':
+            return 200, {'ok': True, 'result': await self._get_updates(params)}
+
+        if self.latency:
+            await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+        if method in RATE_LIMITED_METHODS and random.random() < self.rate_limit_ratio:
+            self.rate_limited[method] += 1
+            return 429, {'ok': False, 'error_code': 429,
+                         'description': f'Too Many Requests: retry after {self.retry_after}',
+                         'parameters': {'retry_after': self.retry_after}}
+
+        if method == 'getMe':
+            result = BOT_USER
+        elif method in ('sendMessage', 'editMessageText', 'editMessageReplyMarkup'):
+            chat_id = int(params['chat_id'])
+            message_id = int(params['message_id']) if 'message_id' in params else None
+            result = self._message(chat_id, params.get('text', 'keyboard'), message_id=message_id)
+            markup = json.loads(params.get('reply_markup', '{}'))
+            if 'inline_keyboard' in markup:
+                # Messages only carry inline keyboards; reply keyboards stay with the client
+                result['reply_markup'] = markup
+            self._reply(chat_id, method, params)
+        elif method == 'answerCallbackQuery':
+            result = True
+            user_id = self._callback_users.pop(params['callback_query_id'], None)
+            if user_id is not None:
+                self._reply(user_id, method, params)
+        elif method in ('setMyCommands', 'deleteWebhook', 'setWebhook'):
+            result = True
+        else:
+            return 404, {'ok': False, 'error_code': 404, 'description': f'Not Found: method {method} not faked'}
+        return 200, {'ok': True, 'result': result}
+
+    def _reply(self, user_id: int, method: str, params: dict):
+        if self.on_reply is not None:
+            self.on_reply(user_id, method, params)
+
+    async def _get_updates(self, params: dict) -> list:
+        self.polling.set()
+        offset = int(params.get('offset', 0))
+        # Updates below the offset were confirmed by the bot
+        self._pending = [update for update in self._pending if update['update_id'] >= offset]
+        timeout = float(params.get('timeout', 0))
+        if not self._pending and timeout > 0:
+            self._has_updates.clear()
+            try:
+                await asyncio.wait_for(self._has_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        return self._pending[:int(params.get('limit', 100))]
@@ -0,0 +1,253 @@
+"""Offline load test of the full bot against a fake Telegram Bot API.
+
+Starts benchmarks/fake_bot_api.py in-process and the bot (bot.py, polling)
+as a subprocess pointed at it through BOT_API_URL, with its own SQLite
+database. Simulated users then send quick-add phrases from the parser
+corpus, /list, button taps on the keyboards they were shown and complete
+/add conversations. Every user waits for the bot's reply before thinking
+and acting again.
+
+Reports throughput, p50/p99 latency per update type (update queued until
+the first reply call for that user) and the bot's database statement
+timings and lock errors, scraped from its /metrics endpoint and log.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --users 2000 --duration 120 --api-latency 0.05
+    python benchmarks/load_test.py --rate-limit-ratio 0.02 --database-url postgresql://localhost/todo_load
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotApi  # noqa: E402
+from parser_benchmark import load_corpus, percentile  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER_ID_BASE = 10_000_000
+# Relative weights of the actions a simulated user picks from
+ACTIONS = {'quick_add': 40, 'list': 25, 'tap': 20, 'add': 15}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def keyboard_choices(markup: dict) -> tuple:
+    """(inline callback data, reply keyboard texts) offered by a reply_markup."""
+    callbacks = [button['callback_data'] for row in markup.get('inline_keyboard', []) for button in row
+                 if 'callback_data' in button]
+    texts = [button if isinstance(button, str) else button['text']
+             for row in markup.get('keyboard', []) for button in row]
+    return callbacks, texts
+
+
+class LoadDriver:
+    def __init__(self, api: FakeBotApi, phrases: list, think_time: float, timeout: float):
+        self.api = api
+        self.phrases = phrases
+        self.think_time = think_time
+        self.timeout = timeout
+        self.latencies = defaultdict(list)
+        self.lost = defaultdict(int)
+        self._waiting = {}
+        api.on_reply = self._on_reply
+
+    def _on_reply(self, user_id: int, method: str, params: dict):
+        # The first reply completes the update; trailing edits for it are ignored
+        future = self._waiting.pop(user_id, None)
+        if future is not None and not future.done():
+            future.set_result(params)
+
+    async def _request(self, kind: str, user_id: int, send) -> dict:
+        future = self._waiting[user_id] = asyncio.get_running_loop().create_future()
+        start = time.perf_counter()
+        send()
+        try:
+            params = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._waiting.pop(user_id, None)
+            self.lost[kind] += 1
+            return None
+        self.latencies[kind].append(time.perf_counter() - start)
+        return params
+
+    async def _text(self, kind: str, user_id: int, text: str) -> dict:
+        return await self._request(kind, user_id, lambda: self.api.send_text(user_id, text))
+
+    async def run_user(self, user_id: int, until: float):
+        keyboard = None  # (message_id, callback data) of the last inline keyboard shown
+        # Spread the first actions so users do not arrive in lockstep
+        await asyncio.sleep(random.uniform(0, self.think_time))
+        while time.monotonic() < until:
+            action = random.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+            if action == 'tap' and keyboard:
+                message_id, callbacks = keyboard
+                reply = await self._request('tap', user_id, lambda: self.api.tap(user_id, message_id, random.choice(callbacks)))
+            elif action == 'add':
+                reply = await self._add_conversation(user_id)
+            elif action == 'quick_add':
+                reply = await self._text('quick_add', user_id, random.choice(self.phrases))
+            else:
+                reply = await self._text('list', user_id, '/list')
+
+            if reply and 'reply_markup' in reply:
+                callbacks, _ = keyboard_choices(json.loads(reply['reply_markup']))
+                if callbacks:
+                    # Fresh messages get their id from the fake API; any id will do for a tap
+                    keyboard = (int(reply.get('message_id', 1)), callbacks)
+            await asyncio.sleep(random.expovariate(1 / self.think_time))
+
+    async def _add_conversation(self, user_id: int):
+        reply = await self._text('add', user_id, '/add')
+        title = random.choice(self.phrases)
+        # Title, then importance, date, time, reminder and recurrence from the offered keyboards
+        for answer in (title, None, None, None, None, 'NO'):
+            if reply is None:
+                return None
+            if answer is None:
+                _, texts = keyboard_choices(json.loads(reply.get('reply_markup', '{}')))
+                answer = random.choice(texts) if texts else 'Tomorrow'
+            await asyncio.sleep(random.expovariate(1 / self.think_time))
+            reply = await self._text('add', user_id, answer)
+        return reply
+
+
+def db_report(metrics_text: str) -> list:
+    """(operation, table, count, mean s, p99 s) per statement kind from the bot's histogram."""
+    buckets, sums, counts = defaultdict(list), {}, {}
+    for line in metrics_text.splitlines():
+        if not line.startswith('todo_bot_db_query_duration_seconds'):
+            continue
+        name_labels, value = line.rsplit(' ', 1)
+        name, _, labels = name_labels.partition('{')
+        labels = dict(part.split('=', 1) for part in labels.rstrip('}').split(','))
+        labels = {key: value.strip('"') for key, value in labels.items()}
+        key = (labels['operation'], labels['table'])
+        if name.endswith('_bucket'):
+            buckets[key].append((float(labels['le']), float(value)))
+        elif name.endswith('_sum'):
+            sums[key] = float(value)
+        else:
+            counts[key] = float(value)
+
+    rows = []
+    for key, count in counts.items():
+        if not count:
+            continue
+        p99 = next(bound for bound, cumulative in buckets[key] if cumulative >= 0.99 * count)
+        rows.append((*key, int(count), sums[key] / count, p99))
+    return sorted(rows, key=lambda row: -row[2] * row[3])
+
+
+async def scrape(port: int) -> str:
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        return ''
+    writer.write(b'GET /metrics HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+    await writer.drain()
+    response = (await reader.read()).decode()
+    writer.close()
+    return response.partition('\r\n\r\n')[2]
+
+
+async def run(args) -> int:
+    api = FakeBotApi(latency=args.api_latency, rate_limit_ratio=args.rate_limit_ratio, retry_after=args.retry_after)
+    await api.start()
+    phrases = [entry['phrase'] for entry in load_corpus()]
+    driver = LoadDriver(api, phrases, args.think_time, args.timeout)
+
+    workdir = tempfile.mkdtemp(prefix='todo-load-')
+    metrics_port = free_port()
+    env = dict(
+        os.environ,
+        BOT_TOKEN='123456:LOADTEST',
+        BOT_API_URL=api.url,
+        BOT_MODE='polling',
+        DATABASE_URL=args.database_url or f'sqlite:///{os.path.join(workdir, "todos.db")}',
+        METRICS_LISTEN='127.0.0.1',
+        METRICS_PORT=str(metrics_port),
+    )
+    log_path = os.path.join(workdir, 'bot.log')
+    with open(log_path, 'wb') as log:
+        bot = await asyncio.create_subprocess_exec(sys.executable, os.path.join(ROOT, 'bot.py'),
+                                                   cwd=workdir, env=env, stdout=log, stderr=log)
+    try:
+        try:
+            await asyncio.wait_for(api.polling.wait(), args.startup_timeout)
+        except asyncio.TimeoutError:
+            print(f"bot did not start polling within {args.startup_timeout}s, see {log_path}")
+            return 1
+
+        start = time.monotonic()
+        until = start + args.duration
+        await asyncio.gather(*(driver.run_user(USER_ID_BASE + n, until) for n in range(args.users)))
+        elapsed = time.monotonic() - start
+        metrics_text = await scrape(metrics_port)
+    finally:
+        if bot.returncode is None:
+            bot.terminate()
+            await bot.wait()
+        await api.stop()
+
+    completed = sum(len(samples) for samples in driver.latencies.values())
+    throughput = completed / elapsed
+    print(f"users: {args.users}, duration: {elapsed:.1f} s, api latency: {args.api_latency * 1000:.0f} ms, "
+          f"429 ratio: {args.rate_limit_ratio}")
+    print(f"updates answered: {completed}, lost: {sum(driver.lost.values())}, throughput: {throughput:.1f} updates/s")
+    print(f"{'update':<10} {'count':>7} {'p50 ms':>8} {'p99 ms':>8} {'lost':>6}")
+    for kind in ACTIONS:
+        samples = driver.latencies.get(kind)
+        if samples:
+            print(f"{kind:<10} {len(samples):>7} {percentile(samples, 50) * 1000:>8.1f} "
+                  f"{percentile(samples, 99) * 1000:>8.1f} {driver.lost[kind]:>6}")
+    print(f"api calls: {dict(api.calls)}")
+    if api.rate_limited:
+        print(f"429s injected: {dict(api.rate_limited)}")
+
+    print(f"{'db statement':<32} {'count':>7} {'mean ms':>8} {'p99 ms':>8}")
+    for operation, table, count, mean, p99 in db_report(metrics_text)[:args.db_rows]:
+        print(f"{operation + ' ' + table:<32} {count:>7} {mean * 1000:>8.2f} {p99 * 1000:>8.1f}")
+    with open(log_path, encoding='utf-8', errors='replace') as log:
+        bot_log = log.read()
+    print(f"database locked errors: {bot_log.count('database is locked')}, "
+          f"handler exceptions: {bot_log.count('Traceback')}")
+    print(f"bot log: {log_path}")
+
+    if args.min_throughput and throughput < args.min_throughput:
+        print(f"throughput regression: {throughput:.1f} < {args.min_throughput:.1f} updates/s")
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--users', type=int, default=1000)
+    arg_parser.add_argument('--duration', type=float, default=60, help='seconds of load after the bot is up')
+    arg_parser.add_argument('--think-time', type=float, default=2.0, help='mean seconds between a user\'s actions')
+    arg_parser.add_argument('--timeout', type=float, default=30, help='seconds before an update counts as lost')
+    arg_parser.add_argument('--api-latency', type=float, default=0.0, help='mean Bot API response time in seconds')
+    arg_parser.add_argument('--rate-limit-ratio', type=float, default=0.0,
+                            help='share of sending calls answered with 429')
+    arg_parser.add_argument('--retry-after', type=int, default=1)
+    arg_parser.add_argument('--database-url', help='defaults to a fresh SQLite file')
+    arg_parser.add_argument('--startup-timeout', type=float, default=60)
+    arg_parser.add_argument('--db-rows', type=int, default=10, help='statement kinds listed in the report')
+    arg_parser.add_argument('--min-throughput', type=float, default=0,
+                            help='fail if answered updates/s drops below this value')
+    return asyncio.run(run(arg_parser.parse_args(argv)))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
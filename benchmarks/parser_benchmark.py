@@ -0,0 +1,157 @@
+"""Benchmark and golden check for TodoParser.parse_todo.
+
+Runs the checked-in corpus of quick-add phrases with the clock frozen, reports
+latency percentiles, throughput and peak memory, and compares every parse
+against the golden expectations stored next to each phrase.
+
+Expectations are what the phrase means, not what the parser currently
+returns. Phrases the parser still gets wrong carry a "known_failure" reason:
+they don't fail the check, and are listed once they start passing so the
+marker can be dropped with --promote-fixed.
+
+    python benchmarks/parser_benchmark.py
+    python benchmarks/parser_benchmark.py --min-throughput 5000
+    python benchmarks/parser_benchmark.py --promote-fixed
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import natural_language_parser  # noqa: E402
+from natural_language_parser import get_parser  # noqa: E402
+
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_corpus.jsonl')
+FROZEN_NOW = datetime(2024, 1, 15, 12, 0)  # Monday
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return FROZEN_NOW
+
+
+def load_corpus(path: str = CORPUS_PATH) -> list:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def serialize(result: dict) -> dict:
+    return {
+        'text': result['text'],
+        'importance': result['importance'].name,
+        'deadline': result['deadline'].strftime('%Y-%m-%d %H:%M'),
+        'reminder_minutes': result['reminder_minutes'],
+        'is_recurring': result['is_recurring'],
+        'recurrence_pattern': result['recurrence_pattern'].name if result['recurrence_pattern'] else None,
+        'recurrence_interval': result['recurrence_interval'],
+    }
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def check_golden(parser, corpus: list) -> tuple:
+    """(mismatches, known failures that now parse as expected)."""
+    mismatches, fixed = [], []
+    for entry in corpus:
+        actual = serialize(parser.parse_todo(entry['phrase']))
+        if actual == entry['expected']:
+            if 'known_failure' in entry:
+                fixed.append(entry)
+        elif 'known_failure' not in entry:
+            mismatches.append((entry['phrase'], entry['expected'], actual))
+    return mismatches, fixed
+
+
+def measure_latency(parser, corpus: list, rounds: int) -> list:
+    samples = []
+    for _ in range(rounds):
+        for entry in corpus:
+            start = time.perf_counter()
+            parser.parse_todo(entry['phrase'])
+            samples.append(time.perf_counter() - start)
+    return samples
+
+
+def measure_peak_memory(parser, corpus: list) -> int:
+    tracemalloc.start()
+    for entry in corpus:
+        parser.parse_todo(entry['phrase'])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def promote_fixed(corpus: list, fixed: list, path: str):
+    for entry in fixed:
+        del entry['known_failure']
+    with open(path, 'w', encoding='utf-8') as f:
+        for entry in corpus:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--corpus', default=CORPUS_PATH)
+    arg_parser.add_argument('--rounds', type=int, default=3, help='passes over the corpus for latency')
+    arg_parser.add_argument('--min-throughput', type=float, default=1000,
+                            help='fail if phrases/s drops below this value')
+    arg_parser.add_argument('--promote-fixed', action='store_true',
+                            help='drop the known_failure marker from phrases that now parse as expected')
+    args = arg_parser.parse_args(argv)
+
+    natural_language_parser.datetime = FrozenDatetime
+    corpus = load_corpus(args.corpus)
+
+    start = time.perf_counter()
+    parser = get_parser()
+    print(f"parser init: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    mismatches, fixed = check_golden(parser, corpus)
+    if args.promote_fixed:
+        promote_fixed(corpus, fixed, args.corpus)
+        print(f"known failures promoted: {len(fixed)}")
+        return 0
+
+    samples = measure_latency(parser, corpus, args.rounds)
+    peak = measure_peak_memory(parser, corpus)
+    throughput = len(samples) / sum(samples)
+
+    print(f"phrases: {len(corpus)} x {args.rounds} rounds")
+    print(f"latency p50: {percentile(samples, 50) * 1e6:.0f} us")
+    print(f"latency p90: {percentile(samples, 90) * 1e6:.0f} us")
+    print(f"latency p99: {percentile(samples, 99) * 1e6:.0f} us")
+    print(f"latency mean: {statistics.mean(samples) * 1e6:.0f} us")
+    print(f"throughput: {throughput:.0f} phrases/s")
+    print(f"peak memory: {peak / 1024:.1f} KiB")
+    print(f"lemma cache: {parser.lemma_cache_info()}")
+    print(f"known failures: {sum('known_failure' in entry for entry in corpus) - len(fixed)}")
+    if fixed:
+        print(f"known failures now passing (run --promote-fixed): {len(fixed)}")
+
+    failed = False
+    if mismatches:
+        failed = True
+        print(f"golden mismatches: {len(mismatches)}")
+        for phrase, expected, actual in mismatches[:10]:
+            print(f"  {phrase!r}\n    expected: {expected}\n    actual:   {actual}")
+    if args.min_throughput and throughput < args.min_throughput:
+        failed = True
+        print(f"throughput regression: {throughput:.0f} < {args.min_throughput:.0f} phrases/s")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Cold-start benchmark: import time of bot.py and time to the first answered update.
+
+Import time is measured in fresh interpreters, so nothing is cached in
+sys.modules. Time to first update starts bot.py against the fake Bot API
+(benchmarks/fake_bot_api.py) with a fresh SQLite database and a quick-add
+message already waiting, and stops when the bot replies to it.
+
+    python benchmarks/startup_benchmark.py
+    python benchmarks/startup_benchmark.py --runs 10 --max-import-ms 800 --max-first-update-ms 3000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_bot_api import FakeBotApi  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_SNIPPET = 'import time; start = time.perf_counter(); import bot; print(time.perf_counter() - start)'
+FIRST_MESSAGE = 'купить молоко завтра в 10'
+
+
+def bot_env(**overrides) -> dict:
+    return dict(os.environ, BOT_TOKEN='123456:STARTUP', METRICS_PORT='0', **overrides)
+
+
+def measure_import(runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET], cwd=ROOT, env=bot_env(),
+                                capture_output=True, text=True, check=True).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return samples
+
+
+async def measure_first_update(parser_preload: str) -> tuple:
+    """(seconds until the bot polls, seconds until it answers the waiting message)."""
+    answered = asyncio.Event()
+    api = FakeBotApi(on_reply=lambda user_id, method, params: answered.set())
+    await api.start()
+    api.send_text(10_000_000, FIRST_MESSAGE)
+
+    workdir = tempfile.mkdtemp(prefix='todo-startup-')
+    env = bot_env(BOT_API_URL=api.url, BOT_MODE='polling', PARSER_PRELOAD=parser_preload,
+                  DATABASE_URL=f'sqlite:///{os.path.join(workdir, "todos.db")}')
+    start = time.perf_counter()
+    bot = await asyncio.create_subprocess_exec(sys.executable, os.path.join(ROOT, 'bot.py'), cwd=workdir, env=env,
+                                               stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+    try:
+        await api.polling.wait()
+        polling = time.perf_counter() - start
+        await answered.wait()
+        return polling, time.perf_counter() - start
+    finally:
+        bot.terminate()
+        await bot.wait()
+        await api.stop()
+
+
+async def measure_startups(runs: int, parser_preload: str) -> list:
+    return [await asyncio.wait_for(measure_first_update(parser_preload), 120) for _ in range(runs)]
+
+
+def main(argv=None) -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument('--runs', type=int, default=5)
+    arg_parser.add_argument('--parser-preload', default='background', choices=('background', 'sync', 'lazy'))
+    arg_parser.add_argument('--max-import-ms', type=float, default=0, help='fail if the median import is slower')
+    arg_parser.add_argument('--max-first-update-ms', type=float, default=0,
+                            help='fail if the median time to the first answered update is slower')
+    args = arg_parser.parse_args(argv)
+
+    imports = measure_import(args.runs)
+    startups = asyncio.run(measure_startups(args.runs, args.parser_preload))
+    import_ms = statistics.median(imports) * 1000
+    polling_ms = statistics.median(polling for polling, _ in startups) * 1000
+    first_update_ms = statistics.median(first for _, first in startups) * 1000
+
+    print(f"runs: {args.runs}, parser preload: {args.parser_preload}")
+    print(f"import bot: median {import_ms:.0f} ms, min {min(imports) * 1000:.0f} ms, "
+          f"max {max(imports) * 1000:.0f} ms")
+    print(f"first getUpdates: median {polling_ms:.0f} ms")
+    print(f"first update answered: median {first_update_ms:.0f} ms")
+
+    failed = False
+    if args.max_import_ms and import_ms > args.max_import_ms:
+        failed = True
+        print(f"import regression: {import_ms:.0f} > {args.max_import_ms:.0f} ms")
+    if args.max_first_update_ms and first_update_ms > args.max_first_update_ms:
+        failed = True
+        print(f"startup regression: {first_update_ms:.0f} > {args.max_first_update_ms:.0f} ms")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
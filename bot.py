@@ -1,245 +1,288 @@
+import asyncio
 import logging
 import math
-from datetime import datetime, timedelta, time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from functools import partial
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from sqlalchemy import func
-from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, CallbackQueryHandler, MessageHandler, filters
-from models import Session, Todo, Importance, TodoStatus, RecurrencePattern
-from config import BOT_TOKEN
-from messages import START_MESSAGE, ADD_HELP_MESSAGE, NO_TODOS_MESSAGE, TODO_LIST_HEADER, TODO_ITEM_TEMPLATE, TODO_ADDED_SUCCESS, TODO_DONE_SUCCESS, TODO_NOT_FOUND, DONE_HELP_MESSAGE, REMINDER_MESSAGE, REMINDER_OVERDUE_MESSAGE
-from utils import calculate_next_deadline
+from telegram import Update, InlineKeyboardMarkup
+from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, filters
+from sqlalchemy import select, update
+from models import AsyncSession, init_db, create_schema, Todo, UserSettings, Importance, TodoStatus, RecurrencePattern
+from config import (BOT_TOKEN, BOT_API_URL, PARSER_PRELOAD, BRIEFING_INTERVAL, BRIEFING_BATCH_SIZE, BOT_MODE, WEBHOOK_QUEUE_SIZE,
+                    LEASE_RENEW_INTERVAL, REMINDER_SYNC_INTERVAL, ARCHIVE_INTERVAL, METRICS_PORT,
+                    PROFILE_FLUSH_INTERVAL)
+from messages import START_MESSAGE, ADD_HELP_MESSAGE, TODO_LIST_HEADER, TODO_ITEM_TEMPLATE, TODO_ADDED_SUCCESS, TODO_DONE_SUCCESS, TODO_NOT_FOUND, DONE_HELP_MESSAGE, BULK_HELP_MESSAGE, TODOS_STATE_CHANGED, TODOS_POSTPONED, REMINDER_MESSAGE, REMINDER_OVERDUE_MESSAGE, TIMEZONE_HELP_MESSAGE, TIMEZONE_SET_MESSAGE, BRIEFING_HELP_MESSAGE, BRIEFING_SET_MESSAGE
+from utils import ensure_user_settings, next_briefing_at, local_day_bounds
 from create_todo import create_todo_conversation_handler
 from list_handler import TodoListHandler
+from history_handler import TodoHistoryHandler
 from button_handler import ButtonHandler
-from keyboard import details_keyboard_buttons, reminder_action_buttons
-from natural_language_parser import TodoParser
-
-
-logging.basicConfig(level=logging.INFO)
+from keyboard import reminder_action_buttons
+from natural_language_parser import get_parser, load_parser, preload_parser
+from reminder_scheduler import reminder_scheduler, overdue_nudge_after
+from delivery import delivery_queue
+from todo_cache import todo_cache
+from webhook import run_webhook
+from bulk_actions import parse_selection, selection_clause, change_status, postpone
+from recurrence import SERIES, expand
+from archive import archive_finished_todos, incremental_vacuum
+from leader import leader_lease
+from metrics import (metrics_server, instrument_engine, wrap_handlers, timed, timed_job,
+                     REMINDER_ROWS, PARSER_LATENCY)
+from profiling import profiler
+from persistence import database_persistence
+from callbacks import CallbackRouter
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text(START_MESSAGE)
 
 
-async def display_todos(update: Update, todos: list, header: str = None):
-    if not todos:
-        await update.message.reply_text(NO_TODOS_MESSAGE)
-        return
-        
-    if header:
-        await update.message.reply_text(header)
-    
-    for todo in todos:
-        text = TODO_ITEM_TEMPLATE.format(
-            id=todo.id,
-            text=todo.text,
-            importance=todo.importance.name,
-            deadline=todo.deadline.strftime('%Y-%m-%d %H:%M'),
-            reminder=todo.reminder_minutes
-        )
-        keyboard = details_keyboard_buttons(todo.id)
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(text, reply_markup=reply_markup)
-
-
 async def check_reminders(context: ContextTypes.DEFAULT_TYPE):
-    session = Session()
     now = datetime.now()
-    todos = session.query(Todo).filter(
-        Todo.deadline > now,
-        Todo.status == TodoStatus.ACTIVE,
-        Todo.reminder_sent == False
-    ).all()
+    due = reminder_scheduler.pop_due(now)
+    if not due:
+        reminder_scheduler.rearm()
+        return
 
-    for todo in todos:
-        keyboard = reminder_action_buttons(todo.id)
-        time_diff = todo.deadline - now
-        minutes_until_deadline = time_diff.total_seconds() / 60
-        if minutes_until_deadline <= todo.reminder_minutes:
-            await context.bot.send_message(
-                chat_id=todo.user_id,
-                text=REMINDER_MESSAGE.format(text=todo.text, minutes=math.ceil(minutes_until_deadline)),
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-            todo.reminder_sent = True
-
-    # Post-deadline notifications
-    overdue_todos = session.query(Todo).filter(
-        Todo.deadline <= now,
-        Todo.status == TodoStatus.ACTIVE
-    ).all()
-
-    for todo in overdue_todos:
-        keyboard = reminder_action_buttons(todo.id)
-        time_diff = now - todo.deadline
-        minutes_past_deadline = time_diff.total_seconds() / 60
-        
-        # Notify at deadline and every 30 minutes after
-        if (0 <= minutes_past_deadline < 1) or (abs(minutes_past_deadline % 30) < 1):
-            await context.bot.send_message(
-                chat_id=todo.user_id,
-                text=REMINDER_OVERDUE_MESSAGE.format(text=todo.text, minutes=math.ceil(minutes_past_deadline)),
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-
-    session.commit()
-    session.close()
-
-
-async def list_todos(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    session = Session()
-    todos = session.query(Todo).filter_by(
-        user_id=update.effective_user.id,
-        status=TodoStatus.ACTIVE
-    ).order_by(Todo.importance.desc(), Todo.deadline.asc()).all()
-    
-    await display_todos(update, todos)
-    session.close()
+    try:
+        async with AsyncSession() as session:
+            todos = (await session.scalars(select(Todo).where(
+                Todo.id.in_([todo_id for todo_id, _ in due]),
+                Todo.status == TodoStatus.ACTIVE
+            ))).all()
+            REMINDER_ROWS.inc(len(todos))
+            # Rows are only read; every send is claimed with a conditional UPDATE below
+            session.expunge_all()
+
+            messages = []
+            for todo in todos:
+                keyboard = InlineKeyboardMarkup(reminder_action_buttons(todo.id))
+                if todo.deadline > now and not todo.reminder_sent and todo.remind_at <= now:
+                    # Claim on remind_at too: a postpone by another worker makes this entry stale
+                    if await _claim(session, todo, (Todo.reminder_sent == False) & (Todo.remind_at == todo.remind_at),
+                                    reminder_sent=True):
+                        minutes_until_deadline = (todo.deadline - now).total_seconds() / 60
+                        messages.append((todo, REMINDER_MESSAGE.format(
+                            text=todo.text, minutes=math.ceil(minutes_until_deadline)), keyboard))
+                elif todo.next_overdue_notify_at and todo.next_overdue_notify_at <= now:
+                    # Post-deadline notifications: at deadline, then with growing intervals
+                    nudges, next_at = overdue_nudge_after(todo, now)
+                    if await _claim(session, todo, Todo.next_overdue_notify_at == todo.next_overdue_notify_at,
+                                    overdue_nudges=nudges, next_overdue_notify_at=next_at):
+                        minutes_past_deadline = (now - todo.deadline).total_seconds() / 60
+                        messages.append((todo, REMINDER_OVERDUE_MESSAGE.format(
+                            text=todo.text, minutes=math.ceil(minutes_past_deadline)), keyboard))
+                elif todo.deadline > now and not todo.reminder_sent:
+                    # Postponed since this entry was scheduled; wait for the new reminder time
+                    reminder_scheduler.schedule(todo, now)
+
+            await session.commit()
+            fire_times = dict(due)
+            for todo, text, keyboard in messages:
+                delivery_queue.enqueue(chat_id=todo.user_id, text=text, reply_markup=keyboard,
+                                       due_at=fire_times[todo.id])
+                todo_cache.invalidate(todo.user_id)
+                reminder_scheduler.schedule(todo, now)
+    finally:
+        reminder_scheduler.rearm()
+
+
+async def _claim(session, todo: Todo, expected, **values) -> bool:
+    """Apply `values` only if the row still matches `expected`.
+
+    Every worker that has the todo scheduled races for the same row; the one
+    whose UPDATE matches sends the message, the rest drop the todo. The
+    in-memory todo is updated to match so it can be rescheduled.
+    """
+    result = await session.execute(update(Todo).where(Todo.id == todo.id, expected).values(**values))
+    if result.rowcount != 1:
+        return False
+    for key, value in values.items():
+        setattr(todo, key, value)
+    return True
+
+
+def _selection_from_args(context: ContextTypes.DEFAULT_TYPE):
+    """WHERE clause for the todos picked by /done, /close, /fail or /postpone, None if unparsable."""
+    try:
+        return selection_clause(*parse_selection(context.args), datetime.now())
+    except ValueError:
+        return None
 
 
-async def show_smart_list(update: Update, context: ContextTypes.DEFAULT_TYPE, days: int = 0):
-    session = Session()
-    now = datetime.now()
-    
-    if days == 0:
-        start_date = now.date()
-        end_date = start_date + timedelta(days=1)
-        title = "📝 Today's tasks"
-    elif days == 7:
-        start_date = now.date()
-        end_date = start_date + timedelta(days=7)
-        title = "📅 This week's tasks"
-    
-    todos = session.query(Todo).filter(
-        Todo.user_id == update.effective_user.id,
-        Todo.status == TodoStatus.ACTIVE,
-        Todo.deadline <= end_date
-    ).order_by(Todo.importance.desc(), Todo.deadline.asc()).all()
-    
-    await display_todos(update, todos, title)
-    session.close()
+async def change_todo_state(update: Update, context: ContextTypes.DEFAULT_TYPE, new_state: TodoStatus):
+    clause = _selection_from_args(context)
+    if clause is None:
+        command_name = update.message.text.split()[0][1:].split('@')[0]  # Remove the '/' and bot name
+        await update.message.reply_text(BULK_HELP_MESSAGE.format(command=command_name))
+        return
 
+    user_id = update.effective_user.id
+    async with AsyncSession() as session:
+        changed, advanced = await change_status(session, user_id, clause, new_state)
+        await session.commit()
 
-async def change_todo_state(update: Update, context: ContextTypes.DEFAULT_TYPE, new_state: TodoStatus):
-    try:
-        command_name = update.message.text.split()[0][1:]  # Remove the '/' from command
-        todo_id = int(update.message.text.replace(f'/{command_name} ', ''))
-        
-        session = Session()
-        todo = session.query(Todo).filter_by(
-            id=todo_id,
-            user_id=update.effective_user.id
-        ).first()
-        
-        if todo:
-            todo.status = new_state
-            session.commit()
-            await update.message.reply_text(f"TODO marked as {new_state.value}!")
-        else:
-            await update.message.reply_text("TODO not found!")
-        
-        session.close()
-    except:
-        await update.message.reply_text(f"Please use format: /{command_name} <todo_id>")
-
-
-async def history(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    keyboard = [
-        [
-            InlineKeyboardButton("Last Week", callback_data="history_week"),
-            InlineKeyboardButton("Last Month", callback_data="history_month")
-        ],
-        [
-            InlineKeyboardButton("Done", callback_data="history_done"),
-            InlineKeyboardButton("Failed", callback_data="history_failed"),
-            InlineKeyboardButton("Closed", callback_data="history_closed")
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text("Select filter for completed tasks:", reply_markup=reply_markup)
+    if not changed and not advanced:
+        await update.message.reply_text(TODO_NOT_FOUND)
+        return
+    todo_cache.invalidate(user_id)
+    for todo in changed:
+        reminder_scheduler.discard(todo.id)
+    for todo in advanced:
+        reminder_scheduler.schedule(todo)
+    await update.message.reply_text(TODOS_STATE_CHANGED.format(count=len(changed) + len(advanced), state=new_state.value))
+
+
+async def postpone_todos(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    clause = _selection_from_args(context)
+    if clause is None:
+        await update.message.reply_text(BULK_HELP_MESSAGE.format(command='postpone'))
+        return
 
+    user_id = update.effective_user.id
+    async with AsyncSession() as session:
+        todos = await postpone(session, user_id, clause, timedelta(days=1))
+        await session.commit()
 
-async def handle_history_filter(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    
-    query = update.callback_query
-    filter_type = query.data.split('_')[1]
-    print(query)
-    session = Session()
-    base_query = session.query(Todo).filter_by(user_id=update.effective_user.id)
-    
-    if filter_type == 'week':
-        week_ago = datetime.now() - timedelta(days=7)
-        todos = base_query.filter(Todo.status != TodoStatus.ACTIVE, Todo.deadline >= week_ago).all()
-    elif filter_type == 'month':
-        month_ago = datetime.now() - timedelta(days=30)
-        todos = base_query.filter(Todo.status != TodoStatus.ACTIVE, Todo.deadline >= month_ago).all()
-    else:
-        status = TodoStatus[filter_type.upper()]
-        todos = base_query.filter_by(status=status).all()
-    
     if not todos:
-        await query.edit_message_text("No tasks found with selected filter!")
+        await update.message.reply_text(TODO_NOT_FOUND)
         return
-    
-    response = "📋 Task History:\n\n"
+    todo_cache.invalidate(user_id)
     for todo in todos:
-        response += TODO_ITEM_TEMPLATE.format(
+        reminder_scheduler.schedule(todo)
+    await update.message.reply_text(TODOS_POSTPONED.format(count=len(todos)))
+
+
+async def _group_by_user(todos):
+    # Rows arrive ordered by user_id, so only one user's batch is held at a time
+    user_id, batch = None, []
+    async for todo in todos:
+        if batch and todo.user_id != user_id:
+            yield user_id, batch
+            batch = []
+        user_id = todo.user_id
+        batch.append(todo)
+    if batch:
+        yield user_id, batch
+
+
+async def send_daily_todos(context: ContextTypes.DEFAULT_TYPE):
+    """Rolling briefing: every run handles the users whose local briefing time has passed."""
+    if not leader_lease.is_leader:
+        return
+    now = datetime.utcnow()
+    
+    while True:
+        async with AsyncSession() as session:
+            due_settings = (await session.scalars(
+                select(UserSettings)
+                .where(UserSettings.next_briefing_at <= now)
+                .order_by(UserSettings.next_briefing_at)
+                .limit(BRIEFING_BATCH_SIZE)
+            )).all()
+            if not due_settings:
+                return
+            session.expunge_all()
+            
+            # Claim each user's briefing before sending, so a worker that still believes
+            # it holds an expired lease cannot send the same briefing twice
+            shards = {}
+            for settings in due_settings:
+                claimed = await session.execute(
+                    update(UserSettings)
+                    .where(UserSettings.user_id == settings.user_id,
+                           UserSettings.next_briefing_at == settings.next_briefing_at)
+                    .values(next_briefing_at=next_briefing_at(settings.timezone, settings.briefing_time, now))
+                )
+                if claimed.rowcount == 1:
+                    shards.setdefault(settings.timezone, []).append(settings.user_id)
+            await session.commit()
+            
+            # Users sharing a zone share the same "today" range, so each shard is one query
+            for tz_name, user_ids in shards.items():
+                day_start, day_end = local_day_bounds(tz_name, now)
+                # Series whose pending occurrence is before today may still recur today
+                occurrences = {}
+                for series in await session.scalars(select(Todo).where(
+                    Todo.user_id.in_(user_ids),
+                    Todo.status == TodoStatus.ACTIVE,
+                    SERIES,
+                    Todo.deadline < day_start
+                )):
+                    occurrences.setdefault(series.user_id, []).extend(expand(series, day_start, day_end))
+                
+                todos = await session.stream_scalars(
+                    select(Todo).where(
+                        Todo.user_id.in_(user_ids),
+                        Todo.status == TodoStatus.ACTIVE,
+                        Todo.deadline >= day_start,
+                        Todo.deadline < day_end
+                    ).order_by(Todo.user_id, Todo.deadline)
+                    .execution_options(yield_per=BRIEFING_BATCH_SIZE)
+                )
+                
+                # Send daily briefing to each user who has todos
+                async for user_id, user_todos in _group_by_user(todos):
+                    delivery_queue.enqueue(chat_id=user_id, text=_briefing_message(
+                        user_todos + occurrences.pop(user_id, [])
+                    ))
+                for user_id, user_occurrences in occurrences.items():
+                    if user_occurrences:
+                        delivery_queue.enqueue(chat_id=user_id, text=_briefing_message(user_occurrences))
+
+
+def _briefing_message(todos: list) -> str:
+    message = "🌅 Your tasks for today:\n\n"
+    for todo in sorted(todos, key=lambda todo: todo.deadline):
+        message += TODO_ITEM_TEMPLATE.format(
             id=todo.id,
             text=todo.text,
             importance=todo.importance.name,
-            deadline=todo.deadline.strftime('%Y-%m-%d %H:%M'),
+            deadline=todo.deadline.strftime('%H:%M'),
             reminder=todo.reminder_minutes
         )
-        response += f"Status: {todo.status.value}\n"
-        response += "──────────────────\n"
-    
-    await query.edit_message_text(response)
-    session.close()
+    return message
 
 
-async def send_daily_todos(context: ContextTypes.DEFAULT_TYPE):
-    session = Session()
-    today = datetime.now().date()
-    
-    # Get all active todos for today grouped by user
-    todos_by_user = {}
-    todos = session.query(Todo).filter(
-        Todo.status == TodoStatus.ACTIVE,
-        func.date(Todo.deadline) == today
-    ).all()
-    
-    for todo in todos:
-        if todo.user_id not in todos_by_user:
-            todos_by_user[todo.user_id] = []
-        todos_by_user[todo.user_id].append(todo)
+async def set_timezone(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        tz_name = context.args[0]
+        ZoneInfo(tz_name)
+    except (IndexError, ValueError, ZoneInfoNotFoundError):
+        await update.message.reply_text(TIMEZONE_HELP_MESSAGE)
+        return
     
-    # Send daily briefing to each user who has todos
-    for user_id, user_todos in todos_by_user.items():
-        if not user_todos:
-            continue
-            
-        message = "🌅 Your tasks for today:\n\n"
-        for todo in user_todos:
-            message += TODO_ITEM_TEMPLATE.format(
-                id=todo.id,
-                text=todo.text,
-                importance=todo.importance.name,
-                deadline=todo.deadline.strftime('%H:%M'),
-                reminder=todo.reminder_minutes
-            )
-        
-        await context.bot.send_message(chat_id=user_id, text=message)
+    await _update_briefing_settings(update.effective_user.id, timezone=tz_name)
+    await update.message.reply_text(TIMEZONE_SET_MESSAGE.format(timezone=tz_name))
+
+
+async def set_briefing_time(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        briefing_time = datetime.strptime(context.args[0], '%H:%M').time()
+    except (IndexError, ValueError):
+        await update.message.reply_text(BRIEFING_HELP_MESSAGE)
+        return
     
-    session.close()
+    await _update_briefing_settings(update.effective_user.id, briefing_time=briefing_time)
+    await update.message.reply_text(BRIEFING_SET_MESSAGE.format(time=briefing_time.strftime('%H:%M')))
+
+
+async def _update_briefing_settings(user_id: int, **changes):
+    async with AsyncSession() as session:
+        await ensure_user_settings(session, user_id)
+        settings = await session.get(UserSettings, user_id)
+        for key, value in changes.items():
+            setattr(settings, key, value)
+        settings.next_briefing_at = next_briefing_at(settings.timezone, settings.briefing_time, datetime.utcnow())
+        await session.commit()
 
 
 async def quick_add_todo(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    parser = TodoParser()
-    todo_data = parser.parse_todo(update.message.text)
+    parser = await load_parser()
+    with PARSER_LATENCY.time():
+        todo_data = parser.parse_todo(update.message.text)
     
-    session = Session()
     todo = Todo(
         user_id=update.effective_user.id,
         text=todo_data['text'],
@@ -247,11 +290,15 @@ async def quick_add_todo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         deadline=todo_data['deadline'],
         reminder_minutes=todo_data['reminder_minutes'],
         is_recurring=todo_data['is_recurring'],
-        recurrence_pattern=todo_data['recurrence_pattern']
+        recurrence_pattern=todo_data['recurrence_pattern'],
+        recurrence_interval=todo_data['recurrence_interval']
     )
-    session.add(todo)
-    session.commit()
-    session.close()
+    async with AsyncSession() as session:
+        session.add(todo)
+        await ensure_user_settings(session, todo.user_id)
+        await session.commit()
+    todo_cache.invalidate(todo.user_id)
+    reminder_scheduler.schedule(todo)
     
     await update.message.reply_text(
         f"✅ Added task: {todo_data['text']}\n"
@@ -268,16 +315,97 @@ async def setup_commands(application):
         ("history", "View completed tasks with filters"),
         ("today", "Show today's tasks"),
         ("week", "Show this week's tasks"),
+        ("timezone", "Set your timezone (format: /timezone Europe/Moscow)"),
+        ("briefing", "Set daily briefing time (format: /briefing HH:MM)"),
+        ("done", "Mark todos done (format: /done 3 7, /done 3-7, /done overdue)"),
+        ("postpone", "Move todos to tomorrow (format: /postpone 3 7, /postpone today)"),
         # ("done|close|fail", "Mark todo state (format: /done <todo_id>)"),
     ]
     await application.bot.set_my_commands(commands)
 
 
+async def report_stats(context: ContextTypes.DEFAULT_TYPE):
+    stats = delivery_queue.stats()
+    if stats['sent'] or stats['queue_depth']:
+        logging.info("Delivery: %s", stats)
+    cache_stats = todo_cache.stats()
+    if cache_stats['hits'] or cache_stats['misses']:
+        logging.info("Todo cache: %s", cache_stats)
+
+
+async def archive_todos(context: ContextTypes.DEFAULT_TYPE):
+    if not leader_lease.is_leader:
+        return
+    moved = await archive_finished_todos()
+    if moved:
+        logging.info("Archived %d finished todos", moved)
+    await incremental_vacuum()
+
+
+async def renew_lease(context: ContextTypes.DEFAULT_TYPE):
+    await leader_lease.renew()
+
+
+async def sync_reminders(context: ContextTypes.DEFAULT_TYPE):
+    # Each worker schedules the todos it writes itself; the leader also picks up
+    # everyone else's, so reminders survive the worker that created them
+    if not leader_lease.is_leader:
+        return
+    async with AsyncSession() as session:
+        await reminder_scheduler.sync(session, timedelta(seconds=2 * REMINDER_SYNC_INTERVAL))
+
+
+async def flush_profiles(context: ContextTypes.DEFAULT_TYPE):
+    profiler.flush()
+
+
+def _job(callback):
+    # Profiled inside the timing wrapper so the histograms include the profiler's overhead
+    return timed_job(profiler.wrap(callback))
+
+
+async def post_init(application):
+    await create_schema()
+    await leader_lease.renew()
+    await delivery_queue.start(application.bot)
+    async with AsyncSession() as session:
+        await reminder_scheduler.load(session)
+    reminder_scheduler.attach(application.job_queue, _job(check_reminders))
+    if PARSER_PRELOAD == 'background':
+        # Dictionaries load in a thread while polling starts; early messages wait for them off the loop
+        preload_parser()
+    if METRICS_PORT:
+        await metrics_server.start()
+
+
+async def post_shutdown(application):
+    await leader_lease.release()
+    await delivery_queue.stop()
+    await metrics_server.stop()
+    profiler.flush()
+
+
 def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    logging.basicConfig(level=logging.INFO)
+    instrument_engine(init_db())
+
+    # Load pymorphy2 dictionaries before polling, so the first message doesn't pay for it
+    if PARSER_PRELOAD == 'sync':
+        get_parser()
+
+    builder = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).post_shutdown(post_shutdown)
+    # Open /add and custom postpone conversations survive restarts
+    builder = builder.persistence(database_persistence)
+    if BOT_API_URL:
+        builder = builder.base_url(f'{BOT_API_URL}/bot').base_file_url(f'{BOT_API_URL}/file/bot')
+    if BOT_MODE == 'webhook':
+        # Bounded, so a burst of webhook deliveries is pushed back to Telegram with 503s
+        builder = builder.update_queue(asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE))
+    app = builder.build()
 
     # Initialize list handler
     list_handler = TodoListHandler()
+    history_handler = TodoHistoryHandler()
     button_handler = ButtonHandler()
     
     # Command handlers
@@ -285,17 +413,23 @@ def main():
     app.add_handler(CommandHandler("done", partial(change_todo_state, new_state=TodoStatus.DONE)))
     app.add_handler(CommandHandler("close", partial(change_todo_state, new_state=TodoStatus.CLOSED)))
     app.add_handler(CommandHandler("fail", partial(change_todo_state, new_state=TodoStatus.FAILED)))
-    app.add_handler(CommandHandler("history", history))
+    app.add_handler(CommandHandler("postpone", postpone_todos))
+    app.add_handler(CommandHandler("history", history_handler.history))
     app.add_handler(CommandHandler("list", list_handler.list_tasks))
     app.add_handler(CommandHandler("today", partial(list_handler.list_tasks, days=0)))
     app.add_handler(CommandHandler("week", partial(list_handler.list_tasks, days=7)))
+    app.add_handler(CommandHandler("timezone", set_timezone))
+    app.add_handler(CommandHandler("briefing", set_briefing_time))
 
     
-    # Callback handlers with patterns
-    app.add_handler(CallbackQueryHandler(handle_history_filter, pattern="^history_"))
-    # app.add_handler(CallbackQueryHandler(button_handler, pattern="^(done|closed|failed|delay|postpone)_"))
-    app.add_handler(CallbackQueryHandler(button_handler.handle, pattern="^(done|closed|failed|delay|postpone)_"))
-    app.add_handler(CallbackQueryHandler(list_handler.show_details, pattern="^details_"))
+    # Inline buttons: callback_data is decoded once and dispatched by action
+    router = CallbackRouter()
+    router.route('history_filter', history_handler.show)
+    router.route('history', history_handler.show)
+    router.route('details', list_handler.show_details)
+    router.route('list', list_handler.navigate)
+    button_handler.register(router)
+    app.add_handler(router)
 
     # Conversation handler
     app.add_handler(create_todo_conversation_handler())
@@ -304,18 +438,33 @@ def main():
     # Message handlers
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, quick_add_todo))
 
-    # Add reminder job
-    job_queue = app.job_queue
-    job_queue.run_repeating(check_reminders, interval=60)  # Check every minute
+    # Latency histograms per handler, served with the rest on /metrics
+    if profiler.enabled:
+        wrap_handlers(app, profiler.wrap)
+    wrap_handlers(app, timed)
 
-    # Add daily job at 10:00 AM
+    # Reminders fire from a heap of exact due times armed in post_init
     job_queue = app.job_queue
-    job_queue.run_daily(send_daily_todos, time=time(7, 0))
+    job_queue.run_repeating(_job(report_stats), interval=60)
+
+    # One worker per database holds the lease and runs briefings and reminder sync
+    job_queue.run_repeating(_job(renew_lease), interval=LEASE_RENEW_INTERVAL)
+    job_queue.run_repeating(_job(sync_reminders), interval=REMINDER_SYNC_INTERVAL, first=REMINDER_SYNC_INTERVAL)
+    job_queue.run_repeating(_job(archive_todos), interval=ARCHIVE_INTERVAL, first=ARCHIVE_INTERVAL)
+
+    # Daily briefings roll through the day as each user's local briefing time comes up
+    job_queue.run_repeating(_job(send_daily_todos), interval=BRIEFING_INTERVAL, first=10)
     
+    if profiler.enabled:
+        job_queue.run_repeating(flush_profiles, interval=PROFILE_FLUSH_INTERVAL, first=PROFILE_FLUSH_INTERVAL)
+
     # Setup commands menu
     app.job_queue.run_once(setup_commands, when=1, data=app)
     
-    app.run_polling()
+    if BOT_MODE == 'webhook':
+        asyncio.run(run_webhook(app, post_init=post_init, post_shutdown=post_shutdown))
+    else:
+        app.run_polling()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, time
+from sqlalchemy import select, update, or_, and_
+from models import Todo, TodoStatus
+from recurrence import SERIES, advance_series
+
+SELECTORS = ('overdue', 'today', 'week')
+
+
+def parse_selection(args: list) -> tuple:
+    """Split command arguments into (ids, ranges, selectors).
+
+    Accepts ids ("3 7 12" or "3,7,12"), inclusive ranges ("3-7") and the
+    selectors overdue, today and week. Raises ValueError on anything else.
+    """
+    ids, ranges, selectors = set(), [], set()
+    for token in ' '.join(args).replace(',', ' ').lower().split():
+        if token in SELECTORS:
+            selectors.add(token)
+        elif '-' in token:
+            start, end = (int(part) for part in token.split('-', 1))
+            if start > end:
+                raise ValueError(f"Empty range {token}")
+            ranges.append((start, end))
+        else:
+            ids.add(int(token))
+    if not (ids or ranges or selectors):
+        raise ValueError("Nothing selected")
+    return ids, ranges, selectors
+
+
+def selection_clause(ids: set, ranges: list, selectors: set, now: datetime):
+    """WHERE condition matching any of the selected todos; deadlines are server-local like the lists."""
+    day_start = datetime.combine(now.date(), time.min)
+    conditions = []
+    if ids:
+        conditions.append(Todo.id.in_(sorted(ids)))
+    # Ranges stay BETWEENs instead of expanding into huge IN lists
+    conditions.extend(Todo.id.between(start, end) for start, end in ranges)
+    if 'overdue' in selectors:
+        conditions.append(Todo.deadline < now)
+    if 'today' in selectors:
+        conditions.append(and_(Todo.deadline >= day_start, Todo.deadline < day_start + timedelta(days=1)))
+    if 'week' in selectors:
+        conditions.append(and_(Todo.deadline >= day_start, Todo.deadline < day_start + timedelta(days=8)))
+    return or_(*conditions)
+
+
+async def change_status(session, user_id: int, clause, status: TodoStatus) -> tuple:
+    """Move the user's matching active todos to `status` with a single UPDATE.
+
+    Marking a recurring series done keeps it active and moves it to its next
+    occurrence instead. Returns (changed todos, advanced series).
+    """
+    advanced = []
+    if status == TodoStatus.DONE:
+        advanced = (await session.scalars(select(Todo).where(
+            Todo.user_id == user_id,
+            Todo.status == TodoStatus.ACTIVE,
+            SERIES,
+            clause
+        ))).all()
+        now = datetime.now()
+        for todo in advanced:
+            advance_series(todo, now)
+        clause = and_(clause, ~SERIES)
+    changed = (await session.scalars(
+        update(Todo)
+        .where(Todo.user_id == user_id, Todo.status == TodoStatus.ACTIVE, clause)
+        .values(status=status)
+        .returning(Todo)
+    )).all()
+    return changed, advanced
+
+
+async def postpone(session, user_id: int, clause, delta: timedelta) -> list:
+    """Shift the deadlines of the user's matching active todos by `delta`.
+
+    Date arithmetic differs between SQLite and PostgreSQL, so the new
+    deadlines are computed here; the flush sends them as one batched UPDATE.
+    """
+    todos = (await session.scalars(select(Todo).where(
+        Todo.user_id == user_id,
+        Todo.status == TodoStatus.ACTIVE,
+        clause
+    ))).all()
+    for todo in todos:
+        todo.set_deadline(todo.deadline + delta)
+    return todos
@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta
+from telegram import Update
+from telegram.constants import InlineKeyboardButtonLimit
+from telegram.ext import BaseHandler
+from models import Importance
+
+EPOCH = datetime(1970, 1, 1)
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def _to_base36(value: int) -> str:
+    if value < 0:
+        return '-' + _to_base36(-value)
+    digits = ''
+    while True:
+        value, digit = divmod(value, 36)
+        digits = DIGITS[digit] + digits
+        if not value:
+            return digits
+
+
+def _to_time(text: str) -> datetime:
+    return EPOCH + timedelta(microseconds=int(text, 36))
+
+
+def _to_text(value) -> str:
+    text = str(value)
+    if CallbackCodec.separator in text:
+        raise ValueError(f"{text!r} contains the field separator")
+    return text
+
+
+# (encode, decode) per field type; naive datetimes keep microseconds so keyset cursors stay exact
+INT = (_to_base36, lambda text: int(text, 36))
+TIME = (lambda value: _to_base36((value - EPOCH) // timedelta(microseconds=1)), _to_time)
+TEXT = (_to_text, str)
+IMPORTANCE = (lambda value: str(value.value), lambda text: Importance(int(text)))
+
+
+class CallbackCodec:
+    """Compact callback_data: "<version><code>:<field>:<field>...".
+
+    Each action is registered with a one-character code and its field types;
+    ints and timestamps are written in base 36 to stay well inside Telegram's
+    64-byte limit. Buttons from before the codec existed ("done_12",
+    "list_7_n_...") still decode, so old messages keep working.
+    """
+    version = '1'
+    separator = ':'
+
+    def __init__(self):
+        self._actions = {}
+        self._codes = {}
+
+    def register(self, action: str, code: str, *fields):
+        if len(code) != 1 or code in self._codes:
+            raise ValueError(f"Invalid or duplicate callback code {code!r}")
+        self._actions[action] = (code, fields)
+        self._codes[code] = (action, fields)
+
+    def __contains__(self, action: str) -> bool:
+        return action in self._actions
+
+    def encode(self, action: str, *values) -> str:
+        code, fields = self._actions[action]
+        if len(values) != len(fields):
+            raise ValueError(f"{action} takes {len(fields)} fields, got {len(values)}")
+        data = self.version + code + ''.join(
+            self.separator + encode(value) for (encode, _), value in zip(fields, values)
+        )
+        if len(data.encode()) > InlineKeyboardButtonLimit.MAX_CALLBACK_DATA:
+            raise ValueError(f"Callback data for {action} exceeds 64 bytes: {data}")
+        return data
+
+    def decode(self, data: str) -> tuple:
+        """(action, field values); raises ValueError for data this codec can't read."""
+        if not data:
+            raise ValueError("Empty callback data")
+        if not data[0].isdigit():
+            return self._decode_legacy(data)
+        if data[0] != self.version:
+            raise ValueError(f"Unsupported callback version {data[0]}")
+        code, *parts = data[1:].split(self.separator)
+        if code not in self._codes:
+            raise ValueError(f"Unknown callback code {code!r}")
+        action, fields = self._codes[code]
+        if len(parts) != len(fields):
+            raise ValueError(f"Malformed {action} callback: {data}")
+        return action, tuple(decode(part) for (_, decode), part in zip(fields, parts))
+
+    def matches(self, action: str):
+        """Pattern for CallbackQueryHandler accepting only `action` (e.g. conversation entry points)."""
+        def pattern(data) -> bool:
+            try:
+                return isinstance(data, str) and self.decode(data)[0] == action
+            except ValueError:
+                return False
+        return pattern
+
+    def _decode_legacy(self, data: str) -> tuple:
+        parts = data.split('_')
+        action = parts[0]
+        try:
+            if action in ('done', 'closed', 'failed', 'delay', 'details', 'custompostpone') and len(parts) == 2:
+                return action, (int(parts[1]),)
+            if action == 'postpone' and len(parts) == 3:
+                return action, (int(parts[1]),)
+            if action == 'list' and len(parts) == 6:
+                _, scope, direction, deadline, importance, todo_id = parts
+                return action, (scope, direction, datetime.strptime(deadline, '%Y%m%d%H%M%S%f'),
+                                Importance(int(importance)), int(todo_id))
+            if action == 'history' and len(parts) == 2:
+                return 'history_filter', (parts[1],)
+            if action == 'history' and len(parts) == 5:
+                _, filter_type, direction, deadline, todo_id = parts
+                return action, (filter_type, direction, datetime.strptime(deadline, '%Y%m%d%H%M%S%f'), int(todo_id))
+        except ValueError:
+            pass
+        raise ValueError(f"Unknown callback data {data!r}")
+
+
+callback_codec = CallbackCodec()
+callback_codec.register('done', 'd', INT)
+callback_codec.register('closed', 'c', INT)
+callback_codec.register('failed', 'f', INT)
+callback_codec.register('delay', 'p', INT)
+callback_codec.register('postpone', 't', INT)
+callback_codec.register('custompostpone', 'u', INT)
+callback_codec.register('details', 'i', INT)
+# scope ('a' or days ahead), direction, then the (deadline, importance, id) keyset cursor
+callback_codec.register('list', 'l', TEXT, TEXT, TIME, IMPORTANCE, INT)
+callback_codec.register('history_filter', 'H', TEXT)
+# filter, direction, then the (deadline, id) keyset cursor
+callback_codec.register('history', 'h', TEXT, TEXT, TIME, INT)
+
+
+class CallbackRouter(BaseHandler):
+    """Single handler for inline buttons: decodes callback_data once and dispatches on the action.
+
+    Routes are called as callback(update, context, *fields). Actions without
+    a route (e.g. a conversation's entry point) are left to later handlers;
+    data that doesn't decode at all is answered as an expired button.
+    """
+
+    def __init__(self, codec: CallbackCodec = callback_codec):
+        super().__init__(self._expired)
+        self.codec = codec
+        self.routes = {}
+
+    def route(self, action: str, callback):
+        if action not in self.codec:
+            raise KeyError(f"Unregistered callback action {action!r}")
+        self.routes[action] = callback
+
+    def check_update(self, update: object):
+        if not isinstance(update, Update) or update.callback_query is None or update.callback_query.data is None:
+            return None
+        try:
+            action, fields = self.codec.decode(update.callback_query.data)
+        except ValueError:
+            return None, ()
+        return (action, fields) if action in self.routes else None
+
+    async def handle_update(self, update, application, check_result, context):
+        action, fields = check_result
+        if action is None:
+            return await self.callback(update, context)
+        return await self.routes[action](update, context, *fields)
+
+    async def _expired(self, update: Update, context):
+        await update.callback_query.answer("This button is no longer available")
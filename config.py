@@ -1,7 +1,102 @@
 from dotenv import load_dotenv
 import os
+import socket
 
 load_dotenv()
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
-DATABASE_URL = os.getenv('DATABASE_URL')
+# Bot API server, e.g. a local telegram-bot-api or benchmarks/fake_bot_api.py; unset means api.telegram.org
+BOT_API_URL = os.getenv('BOT_API_URL')
+# Any SQLAlchemy URL; sqlite:// and postgresql:// run on their async drivers (aiosqlite, asyncpg)
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///todos.db')
+
+# 'background' loads the parser in a thread as polling starts, 'sync' before it, 'lazy' on first use
+PARSER_PRELOAD = os.getenv('PARSER_PRELOAD', 'background')
+
+# Max number of distinct tokens kept in the parser's lemma cache
+LEMMA_CACHE_SIZE = int(os.getenv('LEMMA_CACHE_SIZE', '10000'))
+
+# Async database connection pool
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+# Seconds before pooled connections are replaced; -1 keeps them forever
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+# SQLite: seconds to wait for the write lock. PostgreSQL: per-statement timeout, 0 disables it
+DB_BUSY_TIMEOUT = float(os.getenv('DB_BUSY_TIMEOUT', '30'))
+DB_STATEMENT_TIMEOUT = float(os.getenv('DB_STATEMENT_TIMEOUT', '30'))
+
+# Outbound delivery: worker count, global msgs/s, min seconds between messages to one chat
+DELIVERY_WORKERS = int(os.getenv('DELIVERY_WORKERS', '8'))
+DELIVERY_RATE = float(os.getenv('DELIVERY_RATE', '30'))
+DELIVERY_PER_CHAT_INTERVAL = float(os.getenv('DELIVERY_PER_CHAT_INTERVAL', '1'))
+DELIVERY_MAX_RETRIES = int(os.getenv('DELIVERY_MAX_RETRIES', '5'))
+
+# Overdue nudges back off from 30 minutes up to this many hours, then stop
+OVERDUE_MAX_NUDGES = int(os.getenv('OVERDUE_MAX_NUDGES', '10'))
+OVERDUE_MAX_INTERVAL_HOURS = float(os.getenv('OVERDUE_MAX_INTERVAL_HOURS', '24'))
+
+# Todos shown per /list, /today and /week page
+LIST_PAGE_SIZE = int(os.getenv('LIST_PAGE_SIZE', '10'))
+# Upper bound on finished todos per /history page; pages also stop at Telegram's message size
+HISTORY_MAX_ITEMS = int(os.getenv('HISTORY_MAX_ITEMS', '40'))
+
+# Daily briefing: default local delivery time, how often due users are collected, rows per batch
+BRIEFING_DEFAULT_TIME = os.getenv('BRIEFING_DEFAULT_TIME', '07:00')
+BRIEFING_INTERVAL = int(os.getenv('BRIEFING_INTERVAL', '300'))
+BRIEFING_BATCH_SIZE = int(os.getenv('BRIEFING_BATCH_SIZE', '500'))
+# IANA zone for new users; unset means the server's local zone
+DEFAULT_TIMEZONE = os.getenv('DEFAULT_TIMEZONE')
+
+# Per-user cache of active todo pages: max cached users and entry lifetime in seconds (see WORKERS)
+TODO_CACHE_MAX_USERS = int(os.getenv('TODO_CACHE_MAX_USERS', '10000'))
+TODO_CACHE_TTL = float(os.getenv('TODO_CACHE_TTL', '300'))
+
+# Update source: 'polling' (default) or 'webhook' served by the built-in HTTP server
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+# Public URL registered with Telegram via setWebhook; leave unset to skip registration
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_QUEUE_SIZE = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+WEBHOOK_KEEPALIVE_TIMEOUT = float(os.getenv('WEBHOOK_KEEPALIVE_TIMEOUT', '75'))
+WEBHOOK_MAX_BODY = int(os.getenv('WEBHOOK_MAX_BODY', str(1024 * 1024)))
+
+# Several workers may share one database: each needs a unique id, and the holder of the
+# lease (renewed every LEASE_RENEW_INTERVAL, lost after LEASE_TTL seconds) runs briefings
+WORKER_ID = os.getenv('WORKER_ID', f'{socket.gethostname()}-{os.getpid()}')
+# Number of workers sharing DATABASE_URL. The todo cache only sees its own worker's writes,
+# so it is disabled when this is above 1
+WORKERS = int(os.getenv('WORKERS', '1'))
+LEASE_TTL = float(os.getenv('LEASE_TTL', '30'))
+LEASE_RENEW_INTERVAL = float(os.getenv('LEASE_RENEW_INTERVAL', '10'))
+# How often the leader pulls reminders written by other workers into its schedule
+REMINDER_SYNC_INTERVAL = int(os.getenv('REMINDER_SYNC_INTERVAL', '60'))
+
+# Finished todos older than ARCHIVE_AFTER_DAYS (by deadline) move to todo_archive every
+# ARCHIVE_INTERVAL seconds, ARCHIVE_BATCH_SIZE rows per transaction
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '30'))
+ARCHIVE_INTERVAL = int(os.getenv('ARCHIVE_INTERVAL', '3600'))
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '1000'))
+# SQLite free pages returned to the OS per archive run; 0 releases all of them
+VACUUM_PAGES = int(os.getenv('VACUUM_PAGES', '0'))
+
+# Prometheus text metrics served on http://METRICS_LISTEN:METRICS_PORT/metrics; port 0 disables it
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Fraction of handler and job calls profiled with cProfile (0 disables profiling); aggregated
+# pstats files are written to PROFILE_DIR every PROFILE_FLUSH_INTERVAL seconds and at shutdown
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_FLUSH_INTERVAL = int(os.getenv('PROFILE_FLUSH_INTERVAL', '300'))
+# Stack depth of tracemalloc snapshots taken in sampled reminder and briefing runs; 0 disables them
+PROFILE_TRACEMALLOC_FRAMES = int(os.getenv('PROFILE_TRACEMALLOC_FRAMES', '10'))
+
+# /add and custom postpone conversations plus user_data survive restarts in the bot_state table;
+# changed entries are written in one batch every PERSISTENCE_INTERVAL seconds, and entries
+# untouched for PERSISTENCE_TTL_DAYS are dropped at startup
+PERSISTENCE_INTERVAL = float(os.getenv('PERSISTENCE_INTERVAL', '5'))
+PERSISTENCE_TTL_DAYS = int(os.getenv('PERSISTENCE_TTL_DAYS', '30'))
@@ -3,9 +3,11 @@ from datetime import datetime, timedelta
 from functools import partial
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters, CommandHandler
-from models import Session, Todo, Importance, RecurrencePattern
+from models import AsyncSession, Todo, Importance, RecurrencePattern
 from messages import TODO_CREEATION_TITLE, TODO_CRETATION_IMPORTANCE, TODO_CRETATION_DEADLINE, TODO_CRETATION_DEADLINE_ERROR, TODO_CRETATION_REMINDER, TODO_CRETATION_RECURRENCE, TODO_ADDED_SUCCESS
-from utils import calculate_next_deadline
+from utils import ensure_user_settings
+from reminder_scheduler import reminder_scheduler
+from todo_cache import todo_cache
 from keyboard import date_selection_keyboard, time_selection_keyboard, reminder_keyboard, recurrence_keyboard
 
 
@@ -90,9 +92,15 @@ async def get_reminder(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 async def save_todo(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    recurrence = None if update.message.text == "NO" else RecurrencePattern[update.message.text]
+    # "WEEKLY 2" repeats every two weeks
+    name, _, interval = update.message.text.partition(' ')
+    try:
+        recurrence = None if name == "NO" else RecurrencePattern[name]
+        interval = int(interval) if interval else 1
+    except (KeyError, ValueError):
+        await update.message.reply_text(TODO_CRETATION_RECURRENCE)
+        return RECURRENCE
     
-    session = Session()
     todo = Todo(
         user_id=update.effective_user.id,
         text=context.user_data['title'],
@@ -101,11 +109,15 @@ async def save_todo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         reminder_minutes=context.user_data['reminder'],
         is_recurring=bool(recurrence),
         recurrence_pattern=recurrence,
+        recurrence_interval=interval if recurrence else None,
         parent_id=None
     )
-    session.add(todo)
-    session.commit()
-    session.close()
+    async with AsyncSession() as session:
+        session.add(todo)
+        await ensure_user_settings(session, todo.user_id)
+        await session.commit()
+    todo_cache.invalidate(todo.user_id)
+    reminder_scheduler.schedule(todo)
     
     await update.message.reply_text(
         TODO_ADDED_SUCCESS.format(
@@ -133,6 +145,8 @@ def create_todo_conversation_handler():
             REMINDER: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_reminder)],
             RECURRENCE: [MessageHandler(filters.TEXT & ~filters.COMMAND, save_todo)]
         },
-        fallbacks=[CommandHandler('cancel', cancel)]
+        fallbacks=[CommandHandler('cancel', cancel)],
+        name='add_todo',
+        persistent=True
     )
     return conv_handler
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from metrics import registry, DELIVERY_LATENCY, REMINDER_LAG
+from config import DELIVERY_WORKERS, DELIVERY_RATE, DELIVERY_PER_CHAT_INTERVAL, DELIVERY_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class OutgoingMessage:
+    chat_id: int
+    text: str
+    reply_markup: object = None
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.monotonic)
+    # When the reminder fell due, for the end-to-end reminder lag
+    due_at: datetime = None
+
+
+class TokenBucket:
+    """Global send budget: `rate` messages per second with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class DeliveryQueue:
+    """Outbound messages sent by a pool of workers under global and per-chat rate limits.
+
+    Jobs call enqueue() and return immediately. 429s pause the whole pool for
+    the RetryAfter period, transient errors are retried with exponential backoff.
+    """
+
+    def __init__(self, workers: int = DELIVERY_WORKERS, rate: float = DELIVERY_RATE,
+                 per_chat_interval: float = DELIVERY_PER_CHAT_INTERVAL, max_retries: int = DELIVERY_MAX_RETRIES):
+        self.workers = workers
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate)
+        self._queue = asyncio.Queue()
+        self._chat_slots = {}
+        self._tasks = []
+        self._pending_retries = 0
+        self._bot = None
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self._latencies = deque(maxlen=1000)
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() + self._pending_retries
+
+    def enqueue(self, chat_id: int, text: str, reply_markup=None, due_at: datetime = None):
+        self._queue.put_nowait(OutgoingMessage(chat_id, text, reply_markup, due_at=due_at))
+
+    async def start(self, bot):
+        self._bot = bot
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10):
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Delivery queue stopped with %d messages pending", self.depth)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(pct):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(pct * len(latencies)))]
+
+        return {
+            'queue_depth': self.depth,
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'rate_limited': self.rate_limited,
+            'latency_p50': percentile(0.5),
+            'latency_p99': percentile(0.99),
+        }
+
+    async def _wait_for_chat_slot(self, chat_id: int):
+        # Reserve the chat's next free slot so parallel workers keep per-chat spacing
+        now = time.monotonic()
+        slot = max(now, self._chat_slots.get(chat_id, 0.0))
+        self._chat_slots[chat_id] = slot + self.per_chat_interval
+        if len(self._chat_slots) > 10000:
+            self._chat_slots = {chat: until for chat, until in self._chat_slots.items() if until > now}
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def _retry_later(self, message: OutgoingMessage, delay: float):
+        self._pending_retries += 1
+
+        def requeue():
+            self._pending_retries -= 1
+            self._queue.put_nowait(message)
+
+        asyncio.get_running_loop().call_later(delay, requeue)
+
+    async def _worker(self):
+        while True:
+            message = await self._queue.get()
+            try:
+                await self._send(message)
+            except Exception:
+                logger.exception("Unexpected delivery failure for chat %s", message.chat_id)
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, message: OutgoingMessage):
+        await self._wait_for_chat_slot(message.chat_id)
+        await self.bucket.acquire()
+        message.attempts += 1
+        try:
+            await self._bot.send_message(
+                chat_id=message.chat_id,
+                text=message.text,
+                reply_markup=message.reply_markup
+            )
+        except RetryAfter as e:
+            self.rate_limited += 1
+            self.bucket.pause(e.retry_after)
+            self._retry_later(message, e.retry_after)
+        except (Forbidden, BadRequest) as e:
+            # The user blocked the bot or the chat is gone; retrying will not help
+            self.failed += 1
+            logger.info("Dropping message to chat %s: %s", message.chat_id, e)
+        except TelegramError as e:
+            if message.attempts > self.max_retries:
+                self.failed += 1
+                logger.warning("Giving up on chat %s after %d attempts: %s", message.chat_id, message.attempts, e)
+                return
+            self.retried += 1
+            self._retry_later(message, min(2 ** message.attempts, 60))
+        else:
+            self.sent += 1
+            latency = time.monotonic() - message.enqueued_at
+            self._latencies.append(latency)
+            DELIVERY_LATENCY.observe(latency)
+            if message.due_at is not None:
+                REMINDER_LAG.observe((datetime.now() - message.due_at).total_seconds())
+
+
+delivery_queue = DeliveryQueue()
+
+registry.callback('todo_bot_messages_total', 'Outbound send attempts by result', lambda: {
+    (('result', 'sent'),): delivery_queue.sent,
+    (('result', 'rate_limited'),): delivery_queue.rate_limited,
+    (('result', 'retried'),): delivery_queue.retried,
+    (('result', 'failed'),): delivery_queue.failed,
+}, type='counter')
+registry.callback('todo_bot_delivery_queue_depth', 'Messages waiting to be sent, retries included',
+                  lambda: delivery_queue.depth)
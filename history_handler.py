@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from telegram import Update, InlineKeyboardMarkup
+from telegram.constants import MessageLimit
+from telegram.ext import ContextTypes
+from sqlalchemy import select, or_, and_
+from models import AsyncSession, TodoStatus
+from messages import TODO_ITEM_TEMPLATE
+from config import HISTORY_MAX_ITEMS
+from keyboard import history_filter_buttons, history_page_buttons
+from archive import todo_history
+
+
+def message_length(text: str) -> int:
+    # Telegram counts the limit in UTF-16 code units, where most emoji take two
+    return len(text.encode('utf-16-le')) // 2
+
+
+class TodoHistoryHandler:
+    header = "📋 Task History:\n\n"
+    separator = "──────────────────\n"
+    periods = {
+        'week': timedelta(days=7),
+        'month': timedelta(days=30),
+    }
+
+    def __init__(self, max_items: int = HISTORY_MAX_ITEMS, max_length: int = MessageLimit.MAX_TEXT_LENGTH):
+        self.max_items = max_items
+        self.max_length = max_length
+
+    async def history(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        reply_markup = InlineKeyboardMarkup(history_filter_buttons())
+        await update.message.reply_text("Select filter for completed tasks:", reply_markup=reply_markup)
+
+    async def show(self, update: Update, context: ContextTypes.DEFAULT_TYPE, filter_type: str,
+                   direction: str = 'o', deadline: datetime = None, todo_id: int = None):
+        """First page for a filter button, or the next page for older/newer navigation."""
+        query = update.callback_query
+        cursor = (deadline, todo_id) if deadline is not None else None
+
+        rows, has_more = await self._fetch_page(update.effective_user.id, filter_type, direction, cursor)
+        await query.answer()
+        if not rows and cursor is not None:
+            # Nothing left past the cursor (rows were archived or the filter window moved on)
+            rows, has_more = await self._fetch_page(update.effective_user.id, filter_type)
+            direction, cursor = 'o', None
+        if not rows:
+            await query.edit_message_text("No tasks found with selected filter!")
+            return
+
+        text, shown = self._render_page(rows)
+        if direction == 'o':
+            page = rows[:shown]
+            has_newer, has_older = cursor is not None, has_more or shown < len(rows)
+        else:
+            # Newer pages are filled from the cursor outwards, then shown newest first
+            page = list(reversed(rows[:shown]))
+            text, _ = self._render_page(page)
+            has_newer, has_older = has_more or shown < len(rows), True
+
+        keyboard = history_page_buttons(filter_type, page[0], page[-1], has_newer, has_older)
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+    async def _fetch_page(self, user_id: int, filter_type: str, direction: str = 'o', cursor: tuple = None):
+        """Up to max_items finished todos past the cursor, ordered by (deadline, id) away from it."""
+        history = todo_history
+        query = select(history).where(history.c.user_id == user_id)
+        if filter_type in self.periods:
+            query = query.where(history.c.deadline >= datetime.now() - self.periods[filter_type])
+        else:
+            query = query.where(history.c.status == TodoStatus[filter_type.upper()])
+
+        if direction == 'o':
+            if cursor:
+                deadline, todo_id = cursor
+                query = query.where(or_(
+                    history.c.deadline < deadline,
+                    and_(history.c.deadline == deadline, history.c.id < todo_id)
+                ))
+            query = query.order_by(history.c.deadline.desc(), history.c.id.desc())
+        else:
+            deadline, todo_id = cursor
+            query = query.where(or_(
+                history.c.deadline > deadline,
+                and_(history.c.deadline == deadline, history.c.id > todo_id)
+            )).order_by(history.c.deadline.asc(), history.c.id.asc())
+
+        async with AsyncSession() as session:
+            rows = (await session.execute(query.limit(self.max_items + 1))).all()
+        return rows[:self.max_items], len(rows) > self.max_items
+
+    def _render_item(self, todo) -> str:
+        return TODO_ITEM_TEMPLATE.format(
+            id=todo.id,
+            text=todo.text,
+            importance=todo.importance.name,
+            deadline=todo.deadline.strftime('%Y-%m-%d %H:%M'),
+            reminder=todo.reminder_minutes
+        ) + f"Status: {todo.status.value}\n" + self.separator
+
+    def _render_page(self, rows: list) -> tuple:
+        """Pack rows into one message up to the size limit; returns (text, rows used)."""
+        parts = [self.header]
+        length = message_length(self.header)
+        for shown, todo in enumerate(rows):
+            item = self._render_item(todo)
+            item_length = message_length(item)
+            if length + item_length > self.max_length:
+                if shown == 0:
+                    # A single oversized task still gets its own (truncated) page
+                    budget = (self.max_length - length - 1) * 2
+                    parts.append(item.encode('utf-16-le')[:budget].decode('utf-16-le', errors='ignore') + "…")
+                    return "".join(parts), 1
+                return "".join(parts), shown
+            parts.append(item)
+            length += item_length
+        return "".join(parts), len(rows)
@@ -1,24 +1,25 @@
 from models import Importance, RecurrencePattern
 from telegram import InlineKeyboardButton, ReplyKeyboardMarkup
+from callbacks import callback_codec
 
 
 def details_keyboard_buttons(todo_id):
     return [
         [
-            InlineKeyboardButton("✅ Done", callback_data=f"done_{todo_id}"),
-            InlineKeyboardButton("❌ Close", callback_data=f"closed_{todo_id}"),
-            InlineKeyboardButton("⚠️ Failed", callback_data=f"failed_{todo_id}")
+            InlineKeyboardButton("✅ Done", callback_data=callback_codec.encode('done', todo_id)),
+            InlineKeyboardButton("❌ Close", callback_data=callback_codec.encode('closed', todo_id)),
+            InlineKeyboardButton("⚠️ Failed", callback_data=callback_codec.encode('failed', todo_id))
         ],
         [
-            InlineKeyboardButton("⏰ Postpone", callback_data=f"delay_{todo_id}")
+            InlineKeyboardButton("⏰ Postpone", callback_data=callback_codec.encode('delay', todo_id))
         ]
     ]
 
 def postpone_keyboard_buttons(todo_id):
     return [
         [
-            InlineKeyboardButton("Tomorrow", callback_data=f"postpone_{todo_id}_tomorrow"),
-            InlineKeyboardButton("Custom date", callback_data=f"custompostpone_{todo_id}")
+            InlineKeyboardButton("Tomorrow", callback_data=callback_codec.encode('postpone', todo_id)),
+            InlineKeyboardButton("Custom date", callback_data=callback_codec.encode('custompostpone', todo_id))
         ]
     ]
 
@@ -51,7 +52,56 @@ def recurrence_keyboard():
 def reminder_action_buttons(todo_id):
     return [
         [
-            InlineKeyboardButton("✅ Done", callback_data=f"done_{todo_id}"),
-            InlineKeyboardButton("📋 Details", callback_data=f"details_{todo_id}")
+            InlineKeyboardButton("✅ Done", callback_data=callback_codec.encode('done', todo_id)),
+            InlineKeyboardButton("📋 Details", callback_data=callback_codec.encode('details', todo_id))
         ]
-    ]
\ No newline at end of file
+    ]
+
+def list_cursor(todo):
+    # Keyset position (deadline, importance, id) in the list order
+    return todo.deadline, todo.importance, todo.id
+
+def list_page_buttons(todos, scope, has_prev, has_next):
+    keyboard = []
+    for index in range(0, len(todos), 5):
+        keyboard.append([
+            InlineKeyboardButton(f"📋 {number}", callback_data=callback_codec.encode('details', todo.id))
+            for number, todo in enumerate(todos[index:index + 5], start=index + 1)
+        ])
+    navigation = []
+    if has_prev:
+        navigation.append(InlineKeyboardButton(
+            "⬅️ Prev", callback_data=callback_codec.encode('list', scope, 'p', *list_cursor(todos[0]))))
+    if has_next:
+        navigation.append(InlineKeyboardButton(
+            "Next ➡️", callback_data=callback_codec.encode('list', scope, 'n', *list_cursor(todos[-1]))))
+    if navigation:
+        keyboard.append(navigation)
+    return keyboard
+
+def history_cursor(todo):
+    # Keyset position (deadline, id) in the newest-first history order
+    return todo.deadline, todo.id
+
+def history_filter_buttons():
+    return [
+        [
+            InlineKeyboardButton("Last Week", callback_data=callback_codec.encode('history_filter', 'week')),
+            InlineKeyboardButton("Last Month", callback_data=callback_codec.encode('history_filter', 'month'))
+        ],
+        [
+            InlineKeyboardButton("Done", callback_data=callback_codec.encode('history_filter', 'done')),
+            InlineKeyboardButton("Failed", callback_data=callback_codec.encode('history_filter', 'failed')),
+            InlineKeyboardButton("Closed", callback_data=callback_codec.encode('history_filter', 'closed'))
+        ]
+    ]
+
+def history_page_buttons(filter_type, first, last, has_newer, has_older):
+    navigation = []
+    if has_newer:
+        navigation.append(InlineKeyboardButton(
+            "⬅️ Newer", callback_data=callback_codec.encode('history', filter_type, 'n', *history_cursor(first))))
+    if has_older:
+        navigation.append(InlineKeyboardButton(
+            "Older ➡️", callback_data=callback_codec.encode('history', filter_type, 'o', *history_cursor(last))))
+    return [navigation] if navigation else []
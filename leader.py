@@ -0,0 +1,63 @@
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import update, or_
+from sqlalchemy.exc import IntegrityError
+from models import AsyncSession, JobLease
+from config import WORKER_ID, LEASE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease:
+    """Database lease electing one worker to run cluster-wide jobs.
+
+    The holder extends `expires_at` on every renew(); any other worker takes
+    the lease over once it has expired, so a crashed leader is replaced
+    within `ttl` seconds. Take over and renewal are a single conditional
+    UPDATE, so two workers can never both succeed.
+    """
+
+    def __init__(self, name: str = 'scheduler', owner: str = WORKER_ID, ttl: float = LEASE_TTL):
+        self.name = name
+        self.owner = owner
+        self.ttl = timedelta(seconds=ttl)
+        self.is_leader = False
+
+    async def renew(self) -> bool:
+        now = datetime.utcnow()
+        async with AsyncSession() as session:
+            result = await session.execute(
+                update(JobLease)
+                .where(JobLease.name == self.name,
+                       or_(JobLease.owner == self.owner, JobLease.expires_at < now))
+                .values(owner=self.owner, expires_at=now + self.ttl)
+            )
+            acquired = result.rowcount == 1
+            if not acquired and await session.get(JobLease, self.name) is None:
+                session.add(JobLease(name=self.name, owner=self.owner, expires_at=now + self.ttl))
+                acquired = True
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Another worker created the lease row first
+                acquired = False
+
+        if acquired != self.is_leader:
+            logger.info("Worker %s %s the %s lease", self.owner, 'acquired' if acquired else 'lost', self.name)
+        self.is_leader = acquired
+        return acquired
+
+    async def release(self):
+        if not self.is_leader:
+            return
+        async with AsyncSession() as session:
+            await session.execute(
+                update(JobLease)
+                .where(JobLease.name == self.name, JobLease.owner == self.owner)
+                .values(expires_at=datetime.utcnow())
+            )
+            await session.commit()
+        self.is_leader = False
+
+
+leader_lease = LeaderLease()
@@ -1,78 +1,196 @@
-from datetime import datetime, timedelta
+from collections import deque
+from datetime import datetime, timedelta, time
+from itertools import islice
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
-from models import Session, Todo, TodoStatus
-from sqlalchemy import func
-from keyboard import details_keyboard_buttons, reminder_action_buttons
+from sqlalchemy import select, or_, and_
+from models import AsyncSession, Todo, TodoStatus, Importance
+from config import LIST_PAGE_SIZE
+from keyboard import details_keyboard_buttons, list_page_buttons
+from todo_cache import todo_cache
+from recurrence import SERIES, expand
+
+# The database sorts importance by its stored name, so merged pages must too
+IMPORTANCE_ORDER = {name: rank for rank, name in enumerate(sorted(Importance.__members__, reverse=True))}
+
+
+def page_key(deadline, importance, todo_id):
+    """Position in the (deadline, importance desc, id) list order."""
+    return deadline, IMPORTANCE_ORDER[importance.name], todo_id
+
 
 class TodoListHandler:
-    def __init__(self):
-        self.compact_template = "📌 {importance} {text}\n⏰ {deadline}\n"
-    
-    async def _display_todos(self, update: Update, todos: list, header: str = None):
-        if not todos:
-            await update.message.reply_text("No tasks found!")
-            return
-            
-        if header:
-            await update.message.reply_text(header)
-        
-        for todo in todos:
-            text = self.compact_template.format(
+    headers = {
+        0: "📝 Today's tasks:",
+        7: "📅 This week's tasks:",
+        None: "📋 All active tasks:"
+    }
+
+    def __init__(self, page_size: int = LIST_PAGE_SIZE):
+        self.page_size = page_size
+        self.compact_template = "{number}. 📌 {importance} {text}\n⏰ {deadline}\n"
+
+    def _render_page(self, days: int, todos: list, has_prev: bool, has_next: bool):
+        lines = [self.headers[days], ""]
+        for number, todo in enumerate(todos, start=1):
+            lines.append(self.compact_template.format(
+                number=number,
                 importance="❗" * todo.importance.value,
                 text=todo.text,
                 deadline=todo.deadline.strftime('%Y-%m-%d %H:%M')
-            )
-            
-            keyboard = reminder_action_buttons(todo.id)
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await update.message.reply_text(text, reply_markup=reply_markup)
+            ))
+        scope = 'a' if days is None else days
+        keyboard = list_page_buttons(todos, scope, has_prev, has_next)
+        return "\n".join(lines), InlineKeyboardMarkup(keyboard)
 
-
-    async def list_tasks(self, update: Update, context: ContextTypes.DEFAULT_TYPE, days: int = None):
-        session = Session()
-        now = datetime.now()
-        
-        query = session.query(Todo).filter(
-            Todo.user_id == update.effective_user.id,
+    async def _fetch_page(self, user_id: int, days: int = None, direction: str = 'n', cursor: tuple = None):
+        """Load one page ordered by (deadline, importance desc, id), after or before a cursor."""
+        query = select(Todo).where(
+            Todo.user_id == user_id,
             Todo.status == TodoStatus.ACTIVE
         )
 
+        end = None
         if days is not None:
-            end_date = now.date() + timedelta(days=days)
-            query = query.filter(func.date(Todo.deadline) <= end_date)
+            # Half-open range on the raw column so the (user_id, status, deadline) index applies
+            end = datetime.combine(datetime.now().date() + timedelta(days=days + 1), time.min)
+            query = query.where(Todo.deadline < end)
 
-        todos = query.order_by(Todo.deadline.asc(), Todo.importance.desc()).all()
-        
-        headers = {
-            0: "📝 Today's tasks:",
-            7: "📅 This week's tasks:",
-            None: "📋 All active tasks:"
-        }
-        
-        await self._display_todos(update, todos, headers[days])
-        session.close()
+        cache_key = ('page', end, direction, cursor, self.page_size)
+        page = todo_cache.get(user_id, cache_key)
+        if page is not None:
+            return page
+        version = todo_cache.version(user_id)
+
+        if direction == 'n':
+            if cursor:
+                deadline, importance, todo_id = cursor
+                query = query.where(or_(
+                    Todo.deadline > deadline,
+                    and_(Todo.deadline == deadline, or_(
+                        Todo.importance < importance,
+                        and_(Todo.importance == importance, Todo.id > todo_id)
+                    ))
+                ))
+            query = query.order_by(Todo.deadline.asc(), Todo.importance.desc(), Todo.id.asc())
+        else:
+            deadline, importance, todo_id = cursor
+            query = query.where(or_(
+                Todo.deadline < deadline,
+                and_(Todo.deadline == deadline, or_(
+                    Todo.importance > importance,
+                    and_(Todo.importance == importance, Todo.id < todo_id)
+                ))
+            )).order_by(Todo.deadline.desc(), Todo.importance.asc(), Todo.id.desc())
+
+        # One extra row tells whether another page exists in this direction
+        async with AsyncSession() as session:
+            todos = (await session.scalars(query.limit(self.page_size + 1))).all()
+            if end is not None:
+                series = (await session.scalars(select(Todo).where(
+                    Todo.user_id == user_id,
+                    Todo.status == TodoStatus.ACTIVE,
+                    SERIES,
+                    Todo.deadline < end
+                ))).all()
+                todos = self._merge_occurrences(todos, series, end, direction, cursor)
+
+        has_more = len(todos) > self.page_size
+        todos = todos[:self.page_size]
+        if direction == 'n':
+            page = todos, cursor is not None, has_more
+        else:
+            page = list(reversed(todos)), has_more, True
+        todo_cache.put(user_id, cache_key, page, version)
+        return page
+
+    def _merge_occurrences(self, todos: list, series: list, end: datetime, direction: str, cursor: tuple):
+        """Merge upcoming occurrences of recurring series into a page of rows.
+
+        Each series is one row holding its pending occurrence; the ones after
+        it that fall inside the window are expanded here, from today on. Only
+        the page_size + 1 occurrences of each series nearest the cursor, on
+        its side, can reach the page.
+        """
+        def key(todo):
+            return page_key(todo.deadline, todo.importance, todo.id)
 
-    async def show_details(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        start = datetime.combine(datetime.now().date(), time.min)
+        after = page_key(*cursor) if cursor else None
+        if cursor and direction == 'n':
+            start = max(start, cursor[0])
+        occurrences = []
+        for todo in series:
+            if direction == 'n':
+                expanded = (occurrence for occurrence in expand(todo, start, end)
+                            if after is None or key(occurrence) > after)
+                occurrences.extend(islice(expanded, self.page_size + 1))
+            else:
+                # Everything from today up to the cursor, keeping the occurrences closest to it
+                expanded = (occurrence for occurrence in expand(todo, start, min(end, cursor[0] + timedelta(microseconds=1)))
+                            if key(occurrence) < after)
+                occurrences.extend(deque(expanded, maxlen=self.page_size + 1))
+        if not occurrences:
+            return todos
+
+        merged = sorted(list(todos) + occurrences, key=key, reverse=direction != 'n')
+        return merged[:self.page_size + 1]
+
+    async def list_tasks(self, update: Update, context: ContextTypes.DEFAULT_TYPE, days: int = None):
+        todos, has_prev, has_next = await self._fetch_page(update.effective_user.id, days)
+        if not todos:
+            await update.message.reply_text("No tasks found!")
+            return
+
+        text, reply_markup = self._render_page(days, todos, has_prev, has_next)
+        await update.message.reply_text(text, reply_markup=reply_markup)
+
+    async def navigate(self, update: Update, context: ContextTypes.DEFAULT_TYPE, scope: str, direction: str,
+                       deadline: datetime, importance: Importance, todo_id: int):
+        query = update.callback_query
+        days = None if scope == 'a' else int(scope)
+        cursor = (deadline, importance, todo_id)
+
+        todos, has_prev, has_next = await self._fetch_page(update.effective_user.id, days, direction, cursor)
+        if not todos:
+            # The page emptied out (e.g. todos were completed); start over from the top
+            todos, has_prev, has_next = await self._fetch_page(update.effective_user.id, days)
+        await query.answer()
+        if not todos:
+            await query.edit_message_text("No tasks found!")
+            return
+
+        text, reply_markup = self._render_page(days, todos, has_prev, has_next)
+        await query.edit_message_text(text, reply_markup=reply_markup)
+
+    async def show_details(self, update: Update, context: ContextTypes.DEFAULT_TYPE, todo_id: int):
         query = update.callback_query
-        todo_id = int(query.data.split('_')[1])
-        
-        session = Session()
-        todo = session.query(Todo).filter_by(
-            id=todo_id,
-            user_id=update.effective_user.id
-        ).first()
         
-        if todo:
-            detailed_text = (
-                f"📌 Task: {todo.text}\n"
-                f"❗ Importance: {todo.importance.name}\n"
-                f"⏰ Deadline: {todo.deadline.strftime('%Y-%m-%d %H:%M')}\n"
-                f"⚡ Reminder: {todo.reminder_minutes} minutes before"
-            )
-            
-            keyboard = details_keyboard_buttons(todo_id)
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text(detailed_text, reply_markup=reply_markup)
+        user_id = update.effective_user.id
+        todo = todo_cache.find_todo(user_id, todo_id)
+        if todo is None:
+            version = todo_cache.version(user_id)
+            async with AsyncSession() as session:
+                todo = (await session.scalars(select(Todo).filter_by(
+                    id=todo_id,
+                    user_id=user_id
+                ))).first()
+            if todo:
+                todo_cache.put(user_id, ('todo', todo_id), ([todo],), version)
         
-        session.close()
\ No newline at end of file
+        if not todo:
+            await query.answer("Todo not found!")
+            return
+
+        detailed_text = (
+            f"📌 Task: {todo.text}\n"
+            f"❗ Importance: {todo.importance.name}\n"
+            f"⏰ Deadline: {todo.deadline.strftime('%Y-%m-%d %H:%M')}\n"
+            f"⚡ Reminder: {todo.reminder_minutes} minutes before"
+        )
+
+        keyboard = details_keyboard_buttons(todo_id)
+        reply_markup = InlineKeyboardMarkup(keyboard)
+        await query.answer()
+        # A new message, so the paged list the button sits on stays in place
+        await query.message.reply_text(detailed_text, reply_markup=reply_markup)
\ No newline at end of file
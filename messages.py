@@ -11,7 +11,9 @@ Available commands:
 📝 /add - Add new TODO
 📋 /list /today /week - Show and state TODOs
 🔍 /history - View completed tasks with filter
-✅ /done|/close|/fail - Mark TODO state
+✅ /done|/close|/fail - Mark TODO state (ids, 3-7, overdue, today)
+⏰ /postpone - Move TODOs to tomorrow
+🌍 /timezone /briefing - Set your timezone and daily briefing time
 """
 
 ADD_HELP_MESSAGE = """
@@ -52,11 +54,20 @@ TODO_ADDED_SUCCESS = "✅ TODO added successfully! 🔔 reminded {minutes} minut
 TODO_DONE_SUCCESS = "✅ TODO marked as done!"
 TODO_NOT_FOUND = "❌ TODO not found!"
 DONE_HELP_MESSAGE = "ℹ️ Please use format: /done <todo_id>"
+BULK_HELP_MESSAGE = "ℹ️ Please use format: /{command} <ids>, e.g. /{command} 3 7 12, /{command} 3-7 or /{command} overdue|today|week"
+TODOS_STATE_CHANGED = "✅ {count} TODO(s) marked as {state}!"
+TODOS_POSTPONED = "⏰ {count} TODO(s) postponed to tomorrow"
 
 # Reminder message
 REMINDER_MESSAGE = "⚠️ Reminder: '{text}' is due in {minutes} minutes!"
 REMINDER_OVERDUE_MESSAGE = "⚠️ OVERDUE: '{text}' is {minutes} minutes past deadline!"
 
+# Briefing settings messages
+TIMEZONE_HELP_MESSAGE = "ℹ️ Please use format: /timezone <Region/City>, e.g. /timezone Europe/Moscow"
+TIMEZONE_SET_MESSAGE = "🌍 Timezone set to {timezone}"
+BRIEFING_HELP_MESSAGE = "ℹ️ Please use format: /briefing HH:MM"
+BRIEFING_SET_MESSAGE = "🌅 Daily briefing will arrive at {time}"
+
 
 #add messages
 TODO_CREEATION_TITLE = "Enter task title:"
@@ -64,4 +75,4 @@ TODO_CRETATION_IMPORTANCE = "Select importance:"
 TODO_CRETATION_DEADLINE = "Enter deadline (YYYY-MM-DD HH:MM)"
 TODO_CRETATION_DEADLINE_ERROR = "Invalid date format. Please use YYYY-MM-DD HH:MM"
 TODO_CRETATION_REMINDER = "How many minutes before to remind?"
-TODO_CRETATION_RECURRENCE = "Select recurrence pattern:"
+TODO_CRETATION_RECURRENCE = "Select recurrence pattern (or type e.g. WEEKLY 2 for every 2 weeks):"
@@ -0,0 +1,272 @@
+import asyncio
+import bisect
+import functools
+import logging
+import re
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from telegram.ext import ConversationHandler
+from callbacks import CallbackRouter
+from config import METRICS_LISTEN, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name, dict(zip(self.labels, key)), value
+
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and three additions."""
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, '') for name in self.labels)
+        series = self._series.get(key)
+        if series is None:
+            # Per-bucket counts (last one is +Inf), sum
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        for key, (counts, total) in self._series.items():
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield f'{self.name}_bucket', {**labels, 'le': bound}, cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+class CallbackMetric:
+    """Samples read from existing counters at scrape time, so the hot path pays nothing."""
+
+    def __init__(self, name: str, help: str, type: str, collect):
+        self.name = name
+        self.help = help
+        self.type = type
+        self._collect = collect
+
+    def samples(self):
+        value = self._collect()
+        if isinstance(value, dict):
+            for labels, sample in value.items():
+                yield self.name, dict(labels), sample
+        else:
+            yield self.name, {}, value
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name: str, help: str, collect, type: str = 'gauge'):
+        """`collect` returns a number, or {((label, value), ...): number} for labelled series."""
+        return self.register(CallbackMetric(name, help, type, collect))
+
+    def register(self, metric):
+        self._metrics = [existing for existing in self._metrics if existing.name != metric.name]
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+HANDLER_LATENCY = registry.histogram(
+    'todo_bot_handler_duration_seconds', 'Time spent in update handlers', ('handler',))
+HANDLER_ERRORS = registry.counter(
+    'todo_bot_handler_errors_total', 'Update handlers that raised', ('handler',))
+JOB_LATENCY = registry.histogram(
+    'todo_bot_job_duration_seconds', 'Time spent in scheduled jobs', ('job',))
+DB_LATENCY = registry.histogram(
+    'todo_bot_db_query_duration_seconds', 'Database statement time by operation and table', ('operation', 'table'))
+REMINDER_ROWS = registry.counter(
+    'todo_bot_reminder_rows_scanned_total', 'Todos loaded by the reminder job')
+REMINDER_LAG = registry.histogram(
+    'todo_bot_reminder_lag_seconds', 'Delay between a reminder falling due and Telegram accepting it',
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 300, 900))
+DELIVERY_LATENCY = registry.histogram(
+    'todo_bot_delivery_latency_seconds', 'Delay between queueing a message and Telegram accepting it',
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+PARSER_LATENCY = registry.histogram(
+    'todo_bot_parser_duration_seconds', 'Natural language parse time per message',
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05))
+
+
+def callback_name(callback) -> str:
+    if isinstance(callback, functools.partial):
+        bound = ','.join(getattr(value, 'name', str(value)) for value in callback.keywords.values())
+        return f'{callback_name(callback.func)}[{bound}]' if bound else callback_name(callback.func)
+    return getattr(callback, '__qualname__', repr(callback))
+
+
+def wrap_handlers(application, wrap):
+    """Replace every registered handler callback with wrap(callback, name), conversations included."""
+    def visit(handler):
+        if isinstance(handler, ConversationHandler):
+            for child in handler.entry_points + handler.fallbacks:
+                visit(child)
+            for children in handler.states.values():
+                for child in children:
+                    visit(child)
+        elif isinstance(handler, CallbackRouter):
+            handler.routes = {action: wrap(callback, callback_name(callback))
+                              for action, callback in handler.routes.items()}
+        else:
+            handler.callback = wrap(handler.callback, callback_name(handler.callback))
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            visit(handler)
+
+
+def timed(callback, name: str, histogram: Histogram = HANDLER_LATENCY, errors: Counter = HANDLER_ERRORS,
+          label: str = 'handler'):
+    @functools.wraps(callback)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await callback(*args, **kwargs)
+        except Exception:
+            errors.inc(**{label: name})
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - start, **{label: name})
+    return wrapper
+
+
+def timed_job(callback):
+    return timed(callback, callback_name(callback), JOB_LATENCY, HANDLER_ERRORS, label='job')
+
+
+_TABLE_RE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=512)
+def statement_labels(statement: str) -> tuple:
+    """(operation, table) for a SQL statement; statements repeat, so this is cached."""
+    operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+    match = _TABLE_RE.search(statement)
+    return operation, match.group(1) if match else ''
+
+
+def instrument_engine(engine):
+    """Time every statement on an (async) engine through its cursor events."""
+    sync_engine = getattr(engine, 'sync_engine', engine)
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        # Kept on the statement's own context, so a failed statement leaves nothing behind
+        context._query_start = time.perf_counter()
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        operation, table = statement_labels(statement)
+        DB_LATENCY.observe(time.perf_counter() - context._query_start, operation=operation, table=table)
+
+
+class MetricsServer:
+    """Serves GET /metrics from the registry; every response closes the connection."""
+
+    def __init__(self, registry: Registry = registry, host: str = METRICS_LISTEN, port: int = METRICS_PORT):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        try:
+            self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        except OSError as e:
+            # e.g. a second worker on the same host; the bot itself keeps running
+            logger.warning("Metrics endpoint unavailable on %s:%s: %s", self.host, self.port, e)
+            return
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Metrics on http://%s:%s/metrics", self.host, self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), 10)
+            method, target = head.decode('latin-1').split(' ', 2)[:2]
+            if method == 'GET' and target.split('?', 1)[0] == '/metrics':
+                status, body = '200 OK', self.registry.render().encode()
+            else:
+                status, body = '404 Not Found', b''
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+metrics_server = MetricsServer()
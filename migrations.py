@@ -0,0 +1,127 @@
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import inspect, text
+
+def _backfill_user_settings(conn):
+    from config import BRIEFING_DEFAULT_TIME
+    from utils import next_briefing_at
+
+    briefing_time = datetime.strptime(BRIEFING_DEFAULT_TIME, '%H:%M').time()
+    next_at = next_briefing_at(None, briefing_time, datetime.utcnow())
+    conn.execute(
+        text("INSERT INTO user_settings (user_id, briefing_time, next_briefing_at) "
+             "SELECT DISTINCT user_id, :briefing_time, :next_at FROM todos "
+             "WHERE user_id NOT IN (SELECT user_id FROM user_settings)"),
+        {'briefing_time': briefing_time.strftime('%H:%M:%S.%f'), 'next_at': next_at}
+    )
+
+
+def _backfill_remind_at(conn):
+    rows = conn.execute(text("SELECT id, deadline, reminder_minutes FROM todos WHERE deadline IS NOT NULL")).all()
+    for todo_id, deadline, reminder_minutes in rows:
+        if isinstance(deadline, str):
+            deadline = datetime.fromisoformat(deadline)
+        conn.execute(
+            text("UPDATE todos SET remind_at = :remind_at WHERE id = :id"),
+            {'remind_at': deadline - timedelta(minutes=reminder_minutes or 0), 'id': todo_id}
+        )
+
+
+def _rebuild_todos_with_autoincrement(conn):
+    # SQLite reuses the highest rowid once it is deleted, so an archived todo's id could
+    # come back for a new todo and collide with its todo_archive row. Only AUTOINCREMENT
+    # prevents that, and it can only be set by rebuilding the table.
+    if conn.dialect.name != 'sqlite':
+        return
+    table_sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'todos'")).scalar()
+    if 'AUTOINCREMENT' in table_sql.upper():
+        return
+    indexes = conn.execute(text(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = 'todos' AND sql IS NOT NULL"
+    )).all()
+    # Same columns in the same order, so rows copy over with SELECT *
+    table_sql = re.sub(r',\s*PRIMARY KEY \(id\)', '', table_sql)
+    table_sql = re.sub(r'\bid INTEGER NOT NULL\b', 'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT', table_sql, count=1)
+
+    conn.execute(text("ALTER TABLE todos RENAME TO todos_old"))
+    for name, _ in indexes:
+        conn.execute(text(f'DROP INDEX "{name}"'))
+    conn.execute(text(table_sql))
+    conn.execute(text("INSERT INTO todos SELECT * FROM todos_old"))
+    conn.execute(text("DROP TABLE todos_old"))
+    for _, index_sql in indexes:
+        conn.execute(text(index_sql))
+    # Continue after every id ever used, archived ones included
+    conn.execute(text("DELETE FROM sqlite_sequence WHERE name = 'todos'"))
+    conn.execute(text(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'todos', MAX(seq) FROM ("
+        "SELECT COALESCE(MAX(id), 0) AS seq FROM todos UNION ALL SELECT COALESCE(MAX(id), 0) FROM todo_archive)"
+    ))
+
+
+# Ordered (version, description, steps). A step is an SQL string or a callable
+# taking the connection. Applied versions are recorded in schema_migrations, so
+# existing databases only run what they are missing.
+MIGRATIONS = [
+    (1, 'composite indexes for hot todo queries', [
+        "CREATE INDEX IF NOT EXISTS ix_todos_user_status_deadline ON todos (user_id, status, deadline)",
+        "CREATE INDEX IF NOT EXISTS ix_todos_status_deadline ON todos (status, deadline)",
+    ]),
+    (2, 'persisted overdue nudge schedule', [
+        "ALTER TABLE todos ADD COLUMN next_overdue_notify_at DATETIME",
+        "ALTER TABLE todos ADD COLUMN overdue_nudges INTEGER DEFAULT 0",
+        "UPDATE todos SET next_overdue_notify_at = deadline, overdue_nudges = 0 WHERE status = 'ACTIVE'",
+        "CREATE INDEX IF NOT EXISTS ix_todos_status_next_overdue ON todos (status, next_overdue_notify_at)",
+    ]),
+    (3, 'per-user briefing settings for existing users', [
+        _backfill_user_settings,
+    ]),
+    (4, 'persisted reminder time for cross-worker reminder sync', [
+        "ALTER TABLE todos ADD COLUMN remind_at DATETIME",
+        _backfill_remind_at,
+        "CREATE INDEX IF NOT EXISTS ix_todos_status_remind_at ON todos (status, remind_at)",
+    ]),
+    (5, 'recurrence rules stored on the series row', [
+        "ALTER TABLE todos ADD COLUMN recurrence_interval INTEGER",
+        "ALTER TABLE todos ADD COLUMN recurrence_start DATETIME",
+        "UPDATE todos SET recurrence_start = deadline WHERE recurrence_pattern IS NOT NULL",
+    ]),
+    (6, 'never reuse todo ids, so archived ids stay unique', [
+        _rebuild_todos_with_autoincrement,
+    ]),
+]
+
+
+def upgrade(conn, metadata):
+    """Create missing tables, then bring an existing database up to the latest version.
+
+    A database created from scratch already matches the models, so its
+    migrations are only recorded, not executed. That includes every
+    PostgreSQL database, which is why the steps above may use SQLite DDL.
+    """
+    fresh = not inspect(conn).has_table('todos')
+    if fresh and conn.dialect.name == 'sqlite':
+        # Only takes effect before the first table exists; lets the archive job shrink the file
+        conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+    metadata.create_all(conn)
+
+    # Runs inside the caller's transaction, so a failed step leaves nothing half-applied
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, description VARCHAR NOT NULL)"
+    ))
+    applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    for version, description, steps in MIGRATIONS:
+        if version in applied:
+            continue
+        if not fresh:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(text(step))
+        conn.execute(
+            text("INSERT INTO schema_migrations (version, description) VALUES (:version, :description)"),
+            {'version': version, 'description': description}
+        )
@@ -1,7 +1,13 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, Time, Enum, ForeignKey, Index, LargeBinary
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from config import (DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE,
+                    DB_BUSY_TIMEOUT, DB_STATEMENT_TIMEOUT)
+from migrations import upgrade
 import enum
+from datetime import timedelta
 
 Base = declarative_base()
 
@@ -22,23 +28,162 @@ class RecurrencePattern(enum.Enum):
     MONTHLY = 'monthly'
     # CUSTOM = 'custom'
 
+def _initial_overdue_notify_at(context):
+    # First overdue nudge is due at the deadline itself
+    return context.get_current_parameters()['deadline']
+
+
+def _initial_recurrence_start(context):
+    # Series are anchored at their first deadline so monthly dates don't drift
+    params = context.get_current_parameters()
+    return params['deadline'] if params.get('recurrence_pattern') else None
+
+
+def _initial_remind_at(context):
+    params = context.get_current_parameters()
+    if params['deadline'] is None:
+        return None
+    return params['deadline'] - timedelta(minutes=params.get('reminder_minutes') or 0)
+
+
 class Todo(Base):
     __tablename__ = 'todos'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer)
+    # Telegram ids need 64 bits; SQLite integers already are, PostgreSQL needs BIGINT
+    user_id = Column(BigInteger)
     text = Column(String)
-    importance = Column(Enum(Importance))
+    # Enums are stored by name as VARCHAR on every backend, so SQLite and PostgreSQL compare and sort alike
+    importance = Column(Enum(Importance, native_enum=False))
     deadline = Column(DateTime, nullable=True)
     reminder_minutes = Column(Integer, default=60)
+    remind_at = Column(DateTime, nullable=True, default=_initial_remind_at)
     reminder_sent = Column(Boolean, default=False)  # New field
-    status = Column(Enum(TodoStatus), default=TodoStatus.ACTIVE)
+    status = Column(Enum(TodoStatus, native_enum=False), default=TodoStatus.ACTIVE)
     is_recurring = Column(Boolean, default=False)
-    recurrence_pattern = Column(Enum(RecurrencePattern), nullable=True)
-    # recurrence_interval = Column(Integer, nullable=True)  # For custom intervals in days
+    recurrence_pattern = Column(Enum(RecurrencePattern, native_enum=False), nullable=True)
+    # A recurring todo is one row holding its rule; see recurrence.py
+    recurrence_interval = Column(Integer, nullable=True)  # Every N days/weeks/months, NULL means 1
+    recurrence_start = Column(DateTime, nullable=True, default=_initial_recurrence_start)
     parent_id = Column(Integer, ForeignKey('todos.id'), nullable=True)
+    # NULL once nudges are exhausted, so abandoned todos drop out of the overdue schedule
+    next_overdue_notify_at = Column(DateTime, nullable=True, default=_initial_overdue_notify_at)
+    overdue_nudges = Column(Integer, default=0)
+
+    __table_args__ = (
+        Index('ix_todos_user_status_deadline', 'user_id', 'status', 'deadline'),
+        Index('ix_todos_status_deadline', 'status', 'deadline'),
+        Index('ix_todos_status_next_overdue', 'status', 'next_overdue_notify_at'),
+        Index('ix_todos_status_remind_at', 'status', 'remind_at'),
+        # Ids of archived (deleted) rows must never be handed out again; see migration 6
+        {'sqlite_autoincrement': True},
+    )
+
+    def set_deadline(self, deadline):
+        self.deadline = deadline
+        self.remind_at = deadline - timedelta(minutes=self.reminder_minutes or 0)
+        self.reminder_sent = False
+        self.next_overdue_notify_at = deadline
+        self.overdue_nudges = 0
+
+
+class UserSettings(Base):
+    __tablename__ = 'user_settings'
+
+    user_id = Column(BigInteger, primary_key=True, autoincrement=False)
+    timezone = Column(String, nullable=True)  # IANA name, NULL means the server's zone
+    briefing_time = Column(Time)
+    next_briefing_at = Column(DateTime, nullable=True, index=True)  # UTC
+
+
+class ArchivedTodo(Base):
+    """Finished todos moved out of `todos` by archive.archive_finished_todos."""
+    __tablename__ = 'todo_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)  # Original todos.id
+    user_id = Column(BigInteger)
+    text = Column(String)
+    importance = Column(Enum(Importance, native_enum=False))
+    deadline = Column(DateTime, nullable=True)
+    reminder_minutes = Column(Integer)
+    status = Column(Enum(TodoStatus, native_enum=False))
+    is_recurring = Column(Boolean)
+    recurrence_pattern = Column(Enum(RecurrencePattern, native_enum=False), nullable=True)
+    recurrence_interval = Column(Integer, nullable=True)
+    parent_id = Column(Integer, nullable=True)
+    archived_at = Column(DateTime)
+
+    __table_args__ = (
+        Index('ix_todo_archive_user_status_deadline', 'user_id', 'status', 'deadline'),
+    )
+
+
+class JobLease(Base):
+    """Time-limited ownership of cluster-wide jobs; see leader.LeaderLease."""
+    __tablename__ = 'job_leases'
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)  # UTC
+
+
+class BotState(Base):
+    """Conversation states and user_data saved by persistence.DatabasePersistence."""
+    __tablename__ = 'bot_state'
+
+    kind = Column(String, primary_key=True)  # 'user_data' or 'conversation:<handler name>'
+    key = Column(String, primary_key=True)  # User id, or the conversation key as JSON
+    data = Column(LargeBinary, nullable=False)  # Pickled value
+    updated_at = Column(DateTime, nullable=False, index=True)  # UTC
+
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+# Built by init_db(), so importing models never opens a database
+async_engine = None
+_schema_ready = False
+# Rows stay usable after commit without implicit (blocking) refreshes
+AsyncSession = async_sessionmaker(expire_on_commit=False)
+
+
+def engine_options(url) -> dict:
+    options = {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+        'pool_recycle': DB_POOL_RECYCLE,
+    }
+    if url.get_backend_name() == 'sqlite':
+        # aiosqlite defaults to NullPool, which reconnects on every session
+        options['poolclass'] = AsyncAdaptedQueuePool
+        options['connect_args'] = {'timeout': DB_BUSY_TIMEOUT}
+    elif url.get_backend_name() == 'postgresql' and DB_STATEMENT_TIMEOUT:
+        options['connect_args'] = {
+            'server_settings': {'statement_timeout': str(int(DB_STATEMENT_TIMEOUT * 1000))}
+        }
+    return options
+
+
+def init_db(url: str = DATABASE_URL):
+    """Create the async engine for `url` and bind AsyncSession to it."""
+    global async_engine, _schema_ready
+    url = make_url(url)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    async_engine = create_async_engine(url, **engine_options(url))
+    AsyncSession.configure(bind=async_engine)
+    _schema_ready = False
+    return async_engine
 
 
-engine = create_engine('sqlite:///todos.db')
-Base.metadata.create_all(engine)
-Session = sessionmaker(bind=engine)
+async def create_schema():
+    """Create and migrate the schema once per process; safe to await from several startup hooks."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    async with async_engine.begin() as conn:
+        await conn.run_sync(upgrade, Base.metadata)
+    _schema_ready = True
@@ -1,11 +1,65 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
+import asyncio
+import logging
 import re
+import threading
+from typing import TYPE_CHECKING
 from models import Importance, RecurrencePattern
-import pymorphy2
+from config import LEMMA_CACHE_SIZE
+
+if TYPE_CHECKING:
+    import pymorphy2
+
+
+logger = logging.getLogger(__name__)
+
+
+_morph = None
+_parser = None
+_init_lock = threading.Lock()
+
+
+def get_morph_analyzer() -> 'pymorphy2.MorphAnalyzer':
+    # Loading the dictionaries is expensive, so the analyzer is shared per process
+    # and pymorphy2 is only imported once something actually parses
+    global _morph
+    if _morph is None:
+        with _init_lock:
+            if _morph is None:
+                import pymorphy2
+                _morph = pymorphy2.MorphAnalyzer()
+    return _morph
+
+
+def get_parser() -> 'TodoParser':
+    global _parser
+    if _parser is None:
+        morph = get_morph_analyzer()
+        with _init_lock:
+            if _parser is None:
+                _parser = TodoParser(morph, lemma_cache_size=LEMMA_CACHE_SIZE)
+    return _parser
+
+
+async def load_parser() -> 'TodoParser':
+    """get_parser() for handlers: a cold load runs in a thread instead of blocking the event loop."""
+    if _parser is not None:
+        return _parser
+    return await asyncio.to_thread(get_parser)
+
+
+def preload_parser() -> threading.Thread:
+    thread = threading.Thread(target=get_parser, name='parser-preload', daemon=True)
+    thread.start()
+    return thread
+
 
 class TodoParser:
-    def __init__(self):
-        self.morph = pymorphy2.MorphAnalyzer()
+    def __init__(self, morph: 'pymorphy2.MorphAnalyzer' = None, lemma_cache_size: int = 10000):
+        self.morph = morph or get_morph_analyzer()
+        # Users keep reusing the same vocabulary, so lemmas are cached per token
+        self.lemma = lru_cache(maxsize=lemma_cache_size)(self._lemmatize)
         
         # Base time units and their variations
         self.time_units = {
@@ -64,110 +118,172 @@ class TodoParser:
             'через два дня': 3
         }
 
+        self._compile_patterns()
+
+    def _compile_patterns(self):
+        # Every keyword vocabulary goes into one alternation over normalized text,
+        # so a single pass finds all markers with their spans
+        vocabularies = {
+            'day': self.day_markers,
+            'weekday': self.weekdays,
+            'shortcut': self.time_shortcuts,
+            'time_of_day': self.time_of_day,
+        }
+        self._markers = {}
+        for kind, vocabulary in vocabularies.items():
+            for key, value in vocabulary.items():
+                phrase = self.normalize_text(key)
+                self._markers.setdefault(phrase, {}).setdefault(kind, value)
+
+        phrases = sorted(self._markers, key=len, reverse=True)
+        alternation = '|'.join(re.escape(phrase) for phrase in phrases)
+        # "напомнить за полчаса" is a reminder offset and "каждый день" an interval, not deadlines
+        not_reminder_or_interval = r'(?<!напомнить за )(?<!напомнить через )(?<!каждый )(?<!раз в )'
+        # Counted intervals too: the "день" in "раз в 3 день" is not a time of day
+        not_counted_interval = r'(?<!каждый \d )(?<!каждый \d\d )(?<!раз в \d )(?<!раз в \d\d )'
+        self._marker_re = re.compile(
+            rf'(?<!\w)(?:(?:в|во)\s+)?{not_reminder_or_interval}{not_counted_interval}({alternation})(?!\w)'
+        )
+        self._number_unit_re = re.compile(rf'{not_reminder_or_interval}(?<!\w)(?:через\s+)?(\d+)\s+(\w+)')
+        self._time_patterns = [
+            (re.compile(r'(?<!раз )(?<!\w)в (\d{1,2})(?::(\d{2}))?(?!\d)'), lambda h, m: (int(h), int(m) if m else 0)),
+            (re.compile(r'(?<!\d)(\d{1,2}):(\d{2})(?!\d)'), lambda h, m: (int(h), int(m))),
+        ]
+        # Optional count for custom intervals: "каждые 2 недели", "раз в 3 дня"
+        self._recurrence_patterns = {
+            re.compile(r'(?<!\w)каждый\s+(?:(\d+)\s+)?(\w+)'): RecurrencePattern.DAILY,
+            re.compile(r'(?<!\w)раз в\s+(?:(\d+)\s+)?(\w+)'): RecurrencePattern.DAILY,
+            re.compile(r'(?<!\w)по\s+()(\w+)'): RecurrencePattern.DAILY
+        }
+        self._reminder_patterns = [
+            (re.compile(r'(?<!\w)напомнить (?:за|через) (\d+)\s+(\w+)'), lambda n, u: int(n) * (60 if u.startswith('час') else 1)),
+            (re.compile(r'(?<!\w)напомнить за полчаса(?!\w)'), lambda: 30),
+            (re.compile(r'(?<!\w)напомнить за час(?!\w)'), lambda: 60),
+        ]
+
+    def _lemmatize(self, word: str) -> str:
+        # Weekday abbreviations like "ср" would otherwise lemmatize to unrelated verbs
+        if word in self.weekdays:
+            return word
+        return self.morph.parse(word)[0].normal_form
+
+    def lemma_cache_info(self):
+        return self.lemma.cache_info()
+
     def normalize_text(self, text: str) -> str:
-        words = text.lower().split()
-        normalized = []
-        for word in words:
-            parsed = self.morph.parse(word)[0]
-            normalized.append(parsed.normal_form)
-        return ' '.join(normalized)
-
-    def parse_relative_time(self, text: str) -> tuple[datetime, str]:
+        return ' '.join(self.lemma(word) for word in text.lower().split())
+
+    def find_markers(self, normalized: str) -> list[tuple[str, object, int, int]]:
+        """Return (kind, value, start, end) for every vocabulary marker in normalized text."""
+        markers = []
+        for match in self._marker_re.finditer(normalized):
+            for kind, value in self._markers[match.group(1)].items():
+                markers.append((kind, value, match.start(), match.end()))
+        return markers
+
+    def _strip_span(self, text: str, normalized: str, start: int, end: int) -> str:
+        # Normalized text holds one lemma per whitespace-separated word of text,
+        # so a span there maps onto whole words of the original text
+        first = normalized.count(' ', 0, start)
+        last = normalized.count(' ', 0, end)
+        words = text.split()
+        return ' '.join(words[:first] + words[last + 1:])
+
+    def _first_marker(self, markers: list, kind: str):
+        return next((marker for marker in markers if marker[0] == kind), None)
+
+    def parse_relative_time(self, text: str, normalized: str = None) -> tuple[datetime, str]:
         now = datetime.now()
-        normalized = self.normalize_text(text)
+        if normalized is None:
+            normalized = self.normalize_text(text)
+        markers = self.find_markers(normalized)
 
         # Check day markers first
-        for marker, days in self.day_markers.items():
-            if marker in normalized:
-                return now + timedelta(days=days), text.replace(marker, '').strip()
-            
-        # Check shortcuts first
-        for shortcut, delta in self.time_shortcuts.items():
-            if shortcut in normalized:
-                return now + delta, re.sub(shortcut, '', text).strip()
+        marker = self._first_marker(markers, 'day')
+        if marker:
+            _, days, start, end = marker
+            return now + timedelta(days=days), self._strip_span(text, normalized, start, end)
+
+        # Then the next occurrence of a weekday
+        marker = self._first_marker(markers, 'weekday')
+        if marker:
+            _, weekday, start, end = marker
+            days = (weekday - now.weekday()) % 7 or 7
+            return now + timedelta(days=days), self._strip_span(text, normalized, start, end)
+
+        # Check shortcuts
+        marker = self._first_marker(markers, 'shortcut')
+        if marker:
+            _, delta, start, end = marker
+            return now + delta, self._strip_span(text, normalized, start, end)
         
         # Parse number + time unit patterns
-        number_pattern = r'(?:через\s+)?(\d+)\s+(\w+)'
-        matches = re.finditer(number_pattern, normalized)
-        
-        for match in matches:
+        for match in self._number_unit_re.finditer(normalized):
             number, unit = match.groups()
-            unit_normal = self.morph.parse(unit)[0].normal_form
+            unit_normal = self.lemma(unit)
             
             if unit_normal in self.time_units:
                 delta_args = {k: v * int(number) for k, v in self.time_units[unit_normal].items()}
-                return now + timedelta(**delta_args), re.sub(match.group(), '', text).strip()
+                return now + timedelta(**delta_args), self._strip_span(text, normalized, *match.span())
         
         return now, text
 
-    def parse_specific_time(self, text: str, base_date: datetime) -> tuple[datetime, str]:
-        normalized = self.normalize_text(text)
+    def parse_specific_time(self, text: str, base_date: datetime, normalized: str = None) -> tuple[datetime, str]:
+        if normalized is None:
+            normalized = self.normalize_text(text)
         
         # Parse exact time patterns (15:00, в 15, etc)
-        time_patterns = [
-            (r'в (\d{1,2})(?::(\d{2}))?', lambda h, m: (int(h), int(m) if m else 0)),
-            (r'(\d{1,2}):(\d{2})', lambda h, m: (int(h), int(m))),
-        ]
-        
-        for pattern, time_func in time_patterns:
-            match = re.search(pattern, text)
+        for pattern, time_func in self._time_patterns:
+            match = pattern.search(text)
             if match:
                 hour, minute = time_func(*match.groups())
-                return base_date.replace(hour=hour, minute=minute), re.sub(pattern, '', text).strip()
+                stripped = text[:match.start()] + text[match.end():]
+                return base_date.replace(hour=hour, minute=minute), ' '.join(stripped.split())
         
         # Check time of day references
-        for tod, hour in self.time_of_day.items():
-            if tod in normalized:
-                return base_date.replace(hour=hour, minute=0), text.replace(tod, '').strip()
+        marker = self._first_marker(self.find_markers(normalized), 'time_of_day')
+        if marker:
+            _, hour, start, end = marker
+            return base_date.replace(hour=hour, minute=0), self._strip_span(text, normalized, start, end)
         
         return base_date, text
 
-    def parse_recurrence(self, text: str) -> tuple[bool, RecurrencePattern, str]:
-        normalized = self.normalize_text(text)
+    def parse_recurrence(self, text: str, normalized: str = None) -> tuple[bool, RecurrencePattern, int, str]:
+        if normalized is None:
+            normalized = self.normalize_text(text)
         
-        patterns = {
-            r'кажд(?:ый|ую|ое)\s+(\w+)': RecurrencePattern.DAILY,
-            r'раз в\s+(\w+)': RecurrencePattern.DAILY,
-            r'по\s+(\w+)': RecurrencePattern.DAILY
+        units = {
+            'день': RecurrencePattern.DAILY,
+            'неделя': RecurrencePattern.WEEKLY,
+            'месяц': RecurrencePattern.MONTHLY,
         }
         
-        for pattern, base_pattern in patterns.items():
-            match = re.search(pattern, normalized)
+        for pattern, base_pattern in self._recurrence_patterns.items():
+            match = pattern.search(normalized)
             if match:
-                unit = match.group(1)
-                unit_normal = self.morph.parse(unit)[0].normal_form
-                
-                if unit_normal == 'день':
-                    pattern = RecurrencePattern.DAILY
-                elif unit_normal == 'неделя':
-                    pattern = RecurrencePattern.WEEKLY
-                elif unit_normal == 'месяц':
-                    pattern = RecurrencePattern.MONTHLY
-                    
-                return True, base_pattern, re.sub(pattern, '', text).strip()
-        
-        return False, None, text
-
-    def parse_reminder(self, text: str) -> tuple[int, str]:
-        normalized = self.normalize_text(text)
+                count, unit = match.groups()
+                recurrence = units.get(self.lemma(unit), base_pattern)
+                return True, recurrence, int(count) if count else 1, self._strip_span(text, normalized, *match.span())
         
-        reminder_patterns = [
-            (r'напомни (?:за|через) (\d+)\s+(\w+)', lambda n, u: int(n) * (60 if u.startswith('час') else 1)),
-            (r'напомни за полчаса', lambda: 30),
-            (r'напомни за час', lambda: 60),
-        ]
+        return False, None, 1, text
+
+    def parse_reminder(self, text: str, normalized: str = None) -> tuple[int, str]:
+        if normalized is None:
+            normalized = self.normalize_text(text)
         
-        for pattern, reminder_func in reminder_patterns:
-            match = re.search(pattern, normalized)
+        for pattern, reminder_func in self._reminder_patterns:
+            match = pattern.search(normalized)
             if match:
-                if len(match.groups()) == 2:
-                    minutes = reminder_func(*match.groups())
-                else:
-                    minutes = reminder_func()
-                return minutes, re.sub(pattern, '', text).strip()
+                minutes = reminder_func(*match.groups())
+                return minutes, self._strip_span(text, normalized, *match.span())
         
         return 30, text  # Default 30 minutes
 
+    def _advance(self, text: str, stripped: str, normalized: str) -> tuple[str, str]:
+        if stripped == text:
+            return text, normalized
+        return stripped, self.normalize_text(stripped)
+
     def parse_todo(self, text: str):
         result = {
             'text': text,
@@ -175,25 +291,32 @@ class TodoParser:
             'deadline': datetime.now().replace(hour=23, minute=59),
             'reminder_minutes': 30,
             'is_recurring': False,
-            'recurrence_pattern': None
+            'recurrence_pattern': None,
+            'recurrence_interval': 1
         }
-        print(self.normalize_text(text))
+        # Lemmatize once; later stages only re-join cached lemmas when text was stripped
+        normalized = self.normalize_text(text)
+        logger.debug("Parsing todo: %s", normalized)
         
         # Parse relative time first
-        deadline, text = self.parse_relative_time(text)
+        deadline, stripped = self.parse_relative_time(text, normalized)
         result['deadline'] = deadline
+        text, normalized = self._advance(text, stripped, normalized)
         
         # Then specific time
-        deadline, text = self.parse_specific_time(text, result['deadline'])
+        deadline, stripped = self.parse_specific_time(text, result['deadline'], normalized)
         result['deadline'] = deadline
+        text, normalized = self._advance(text, stripped, normalized)
         
         # Parse recurrence
-        is_recurring, pattern, text = self.parse_recurrence(text)
+        is_recurring, pattern, interval, stripped = self.parse_recurrence(text, normalized)
         result['is_recurring'] = is_recurring
         result['recurrence_pattern'] = pattern
+        result['recurrence_interval'] = interval
+        text, normalized = self._advance(text, stripped, normalized)
         
         # Parse reminder
-        reminder_minutes, text = self.parse_reminder(text)
+        reminder_minutes, text = self.parse_reminder(text, normalized)
         result['reminder_minutes'] = reminder_minutes
         
         # Clean up final text
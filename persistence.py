@@ -0,0 +1,192 @@
+import asyncio
+import json
+import logging
+import pickle
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import delete, insert, select
+from telegram.ext import BasePersistence, PersistenceInput
+from models import AsyncSession, BotState, create_schema
+from metrics import registry
+from config import PERSISTENCE_INTERVAL, PERSISTENCE_TTL_DAYS
+
+logger = logging.getLogger(__name__)
+
+USER_DATA = 'user_data'
+CONVERSATION = 'conversation:'
+# Rows per delete/insert statement, well below SQLite's bound parameter limit
+WRITE_CHUNK = 500
+
+
+def _dumps(value) -> bytes:
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+
+class DatabasePersistence(BasePersistence):
+    """PTB persistence for user_data and conversation states, stored in the bot_state table.
+
+    PTB hands over every touched entry each `update_interval`; only entries
+    whose pickled value differs from what was last written are queued, and
+    the queue is written in one transaction right after the handover. Empty
+    user_data and ended conversations delete their row. At startup the table
+    is read once as raw bytes and each kind is unpickled only when PTB asks
+    for it; rows older than `ttl` are deleted instead of loaded.
+    """
+
+    def __init__(self, update_interval: float = PERSISTENCE_INTERVAL, ttl: timedelta = timedelta(days=PERSISTENCE_TTL_DAYS)):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.ttl = ttl
+        self.written = 0
+        self._stored = {}  # (kind, key) -> pickled value currently in the database
+        self._pending = {}  # (kind, key) -> pickled value to write, None to delete
+        self._loaded = None  # kind -> {key: pickled value}, until PTB has asked for that kind
+        self._load_lock = asyncio.Lock()
+        self._writer = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def _rows(self, kind: str) -> dict:
+        async with self._load_lock:
+            if self._loaded is None:
+                self._loaded = await self._load()
+        return self._loaded.pop(kind, {})
+
+    async def _load(self) -> dict:
+        # Application.initialize loads persistence before post_init creates the schema
+        await create_schema()
+        loaded = defaultdict(dict)
+        async with AsyncSession() as session:
+            async with session.begin():
+                expired = await session.execute(
+                    delete(BotState).where(BotState.updated_at < datetime.utcnow() - self.ttl)
+                )
+                result = await session.stream(select(BotState.kind, BotState.key, BotState.data))
+                async for kind, key, data in result:
+                    loaded[kind][key] = data
+                    self._stored[kind, key] = data
+        logger.info("Loaded %d persisted entries, expired %d",
+                    sum(map(len, loaded.values())), expired.rowcount)
+        return loaded
+
+    def _decode(self, rows: dict) -> dict:
+        values = {}
+        for key, data in rows.items():
+            try:
+                values[key] = pickle.loads(data)
+            except Exception:
+                # e.g. pickled before a class it references was renamed
+                logger.warning("Skipping unreadable persisted entry %s", key, exc_info=True)
+        return values
+
+    def _queue(self, kind: str, key: str, data: bytes):
+        """Queue `data` for the entry, or its deletion for None."""
+        if self._stored.get((kind, key)) == data:
+            # Back to what the database already holds, e.g. an entry touched without changes
+            self._pending.pop((kind, key), None)
+            return
+        self._pending[kind, key] = data
+        if self._writer is None or self._writer.done():
+            # Starts after the rest of this update_persistence round has been queued
+            self._writer = asyncio.create_task(self._write())
+
+    async def _write(self):
+        while self._pending:
+            batch, self._pending = self._pending, {}
+            try:
+                await self._write_batch(batch)
+            except Exception:
+                # Retried with the next round; newer values queued meanwhile win
+                self._pending = {**batch, **self._pending}
+                logger.exception("Failed to write %d persisted entries", len(batch))
+                return
+            for entry, data in batch.items():
+                if data is None:
+                    self._stored.pop(entry, None)
+                else:
+                    self._stored[entry] = data
+            self.written += len(batch)
+
+    async def _write_batch(self, batch: dict):
+        by_kind = defaultdict(list)
+        for kind, key in batch:
+            by_kind[kind].append(key)
+        now = datetime.utcnow()
+        rows = [{'kind': kind, 'key': key, 'data': data, 'updated_at': now}
+                for (kind, key), data in batch.items() if data is not None]
+        async with AsyncSession() as session:
+            async with session.begin():
+                for kind, keys in by_kind.items():
+                    for start in range(0, len(keys), WRITE_CHUNK):
+                        await session.execute(
+                            delete(BotState).where(BotState.kind == kind, BotState.key.in_(keys[start:start + WRITE_CHUNK]))
+                        )
+                for start in range(0, len(rows), WRITE_CHUNK):
+                    await session.execute(insert(BotState), rows[start:start + WRITE_CHUNK])
+
+    async def get_user_data(self) -> dict:
+        return {int(key): value for key, value in self._decode(await self._rows(USER_DATA)).items()}
+
+    async def get_conversations(self, name: str) -> dict:
+        return {tuple(json.loads(key)): state
+                for key, state in self._decode(await self._rows(CONVERSATION + name)).items()}
+
+    async def update_user_data(self, user_id: int, data: dict):
+        # PTB creates an empty dict for every user it sees; those need no row
+        self._queue(USER_DATA, str(user_id), _dumps(data) if data else None)
+
+    async def drop_user_data(self, user_id: int):
+        self._queue(USER_DATA, str(user_id), None)
+
+    async def update_conversation(self, name: str, key: tuple, new_state):
+        self._queue(CONVERSATION + name, json.dumps(key), None if new_state is None else _dumps(new_state))
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        pass
+
+    async def flush(self):
+        if self._writer is not None:
+            await self._writer
+        if self._pending:
+            self._writer = asyncio.create_task(self._write())
+            await self._writer
+
+    # Not stored (see store_data), but abstract on BasePersistence
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+
+database_persistence = DatabasePersistence()
+
+registry.callback('todo_bot_persistence_writes_total', 'Persisted entries written or deleted',
+                  lambda: database_persistence.written, type='counter')
+registry.callback('todo_bot_persistence_pending_entries', 'Changed entries waiting to be written',
+                  lambda: database_persistence.pending)
@@ -0,0 +1,105 @@
+import cProfile
+import functools
+import logging
+import os
+import pstats
+import random
+import re
+import tracemalloc
+from metrics import callback_name
+from config import PROFILE_SAMPLE_RATE, PROFILE_DIR, PROFILE_TRACEMALLOC_FRAMES
+
+logger = logging.getLogger(__name__)
+
+# Jobs whose sampled runs also record what they allocated
+TRACEMALLOC_JOBS = ('check_reminders', 'send_daily_todos')
+
+
+class HandlerProfiler:
+    """Samples handler and job calls with cProfile and aggregates the results per callback.
+
+    Only one profile can be active per thread, so a sampled call that starts
+    while another one is being profiled runs unprofiled. Awaits inside a
+    profiled call also record whatever other tasks ran meanwhile; at low
+    sample rates that noise averages out. flush() writes one pstats file per
+    callback to `directory`, readable with `python -m pstats` or snakeviz.
+    """
+
+    def __init__(self, sample_rate: float = PROFILE_SAMPLE_RATE, directory: str = PROFILE_DIR,
+                 tracemalloc_frames: int = PROFILE_TRACEMALLOC_FRAMES):
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self.tracemalloc_frames = tracemalloc_frames
+        self._stats = {}
+        self._active = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0
+
+    def wrap(self, callback, name: str = None):
+        """Profiling wrapper for `callback`, or `callback` itself when profiling is off."""
+        if not self.enabled:
+            return callback
+        name = name or callback_name(callback)
+        trace_allocations = self.tracemalloc_frames > 0 and name in TRACEMALLOC_JOBS
+
+        @functools.wraps(callback)
+        async def wrapper(*args, **kwargs):
+            if self._active or random.random() >= self.sample_rate:
+                return await callback(*args, **kwargs)
+            self._active = True
+            snapshot = self._start_tracing() if trace_allocations else None
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                try:
+                    return await callback(*args, **kwargs)
+                finally:
+                    profile.disable()
+            finally:
+                self._active = False
+                if snapshot is not None:
+                    self._finish_tracing(name, *snapshot)
+                self._add(name, profile)
+        return wrapper
+
+    def flush(self):
+        if not self._stats:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for name, stats in self._stats.items():
+            stats.dump_stats(self._path(name, '.prof'))
+        logger.info("Wrote %d handler profiles to %s", len(self._stats), self.directory)
+
+    def _add(self, name: str, profile: cProfile.Profile):
+        stats = self._stats.get(name)
+        if stats is None:
+            self._stats[name] = pstats.Stats(profile)
+        else:
+            stats.add(profile)
+
+    def _start_tracing(self):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(self.tracemalloc_frames)
+        return started, tracemalloc.take_snapshot()
+
+    def _finish_tracing(self, name: str, started: bool, before):
+        # The profiler's own bookkeeping would otherwise top the list
+        exclude = [tracemalloc.Filter(False, module.__file__) for module in (cProfile, tracemalloc)]
+        after = tracemalloc.take_snapshot().filter_traces(exclude)
+        before = before.filter_traces(exclude)
+        if started:
+            tracemalloc.stop()
+        os.makedirs(self.directory, exist_ok=True)
+        # Latest run only, so a frequent job cannot fill the disk
+        after.dump(self._path(name, '.snapshot'))
+        top = after.compare_to(before, 'lineno')[:5]
+        logger.info("Allocations in %s:\n%s", name, '\n'.join(str(stat) for stat in top))
+
+    def _path(self, name: str, suffix: str) -> str:
+        return os.path.join(self.directory, re.sub(r'[^\w.-]+', '_', name) + suffix)
+
+
+profiler = HandlerProfiler()
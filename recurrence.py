@@ -0,0 +1,74 @@
+import calendar
+from datetime import datetime, timedelta
+from models import RecurrencePattern, Todo
+
+# Rows that are recurring series; is_recurring alone may lack a pattern
+SERIES = Todo.recurrence_pattern.isnot(None)
+
+STEPS = {
+    RecurrencePattern.DAILY: timedelta(days=1),
+    RecurrencePattern.WEEKLY: timedelta(weeks=1),
+}
+
+
+class Occurrence:
+    """A future occurrence of a recurring todo, expanded on read and never stored.
+
+    Everything except the deadline is read from the series row.
+    """
+
+    def __init__(self, series: Todo, deadline: datetime):
+        self.series = series
+        self.deadline = deadline
+
+    def __getattr__(self, name):
+        return getattr(self.series, name)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    """Same day `months` later, clamped to the last day of shorter months."""
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence(todo: Todo, index: int) -> datetime:
+    """Deadline of the series' `index`-th occurrence, counted from its anchor."""
+    start = todo.recurrence_start or todo.deadline
+    steps = index * (todo.recurrence_interval or 1)
+    if todo.recurrence_pattern == RecurrencePattern.MONTHLY:
+        return add_months(start, steps)
+    return start + STEPS[todo.recurrence_pattern] * steps
+
+
+def next_occurrence(todo: Todo, after: datetime) -> datetime:
+    """First occurrence of the series strictly after `after`."""
+    start = todo.recurrence_start or todo.deadline
+    if after < start:
+        return start
+    interval = todo.recurrence_interval or 1
+    if todo.recurrence_pattern == RecurrencePattern.MONTHLY:
+        index = ((after.year - start.year) * 12 + after.month - start.month) // interval
+    else:
+        index = (after - start) // (STEPS[todo.recurrence_pattern] * interval)
+    # The estimate can be one off around clamped month ends
+    while index > 0 and occurrence(todo, index - 1) > after:
+        index -= 1
+    while occurrence(todo, index) <= after:
+        index += 1
+    return occurrence(todo, index)
+
+
+def expand(todo: Todo, start: datetime, end: datetime, limit: int = 100):
+    """Occurrences after the series' pending one that fall within [start, end)."""
+    current = next_occurrence(todo, max(todo.deadline, start - timedelta(microseconds=1)))
+    for _ in range(limit):
+        if current >= end:
+            return
+        yield Occurrence(todo, current)
+        current = next_occurrence(todo, current)
+
+
+def advance_series(todo: Todo, now: datetime):
+    """Complete the pending occurrence: the row moves on to the next one after now."""
+    todo.set_deadline(next_occurrence(todo, max(todo.deadline, now)))
@@ -0,0 +1,140 @@
+import heapq
+from datetime import datetime, timedelta
+from apscheduler.jobstores.base import JobLookupError
+from sqlalchemy import select, or_
+from models import Todo, TodoStatus
+from config import OVERDUE_MAX_NUDGES, OVERDUE_MAX_INTERVAL_HOURS
+
+OVERDUE_INTERVAL = timedelta(minutes=30)
+OVERDUE_MAX_INTERVAL = timedelta(hours=OVERDUE_MAX_INTERVAL_HOURS)
+
+
+def next_fire_at(todo: Todo, now: datetime):
+    """Next moment a reminder or overdue nudge is due for the todo, or None."""
+    if todo.status != TodoStatus.ACTIVE or todo.deadline is None:
+        return None
+    if now < todo.deadline and not todo.reminder_sent:
+        return max(todo.deadline - timedelta(minutes=todo.reminder_minutes or 0), now)
+    return todo.next_overdue_notify_at
+
+
+def overdue_nudge_after(todo: Todo, now: datetime):
+    """(overdue_nudges, next_overdue_notify_at) once the current overdue nudge is sent."""
+    nudges = (todo.overdue_nudges or 0) + 1
+    if nudges >= OVERDUE_MAX_NUDGES:
+        return nudges, None
+    interval = min(OVERDUE_INTERVAL * 2 ** (nudges - 1), OVERDUE_MAX_INTERVAL)
+    next_at = (todo.next_overdue_notify_at or now) + interval
+    # After downtime, don't replay every missed nudge
+    return nudges, next_at if next_at > now else now + interval
+
+
+def advance_overdue_nudge(todo: Todo, now: datetime):
+    """Record a sent overdue nudge and move next_overdue_notify_at with doubling backoff."""
+    todo.overdue_nudges, todo.next_overdue_notify_at = overdue_nudge_after(todo, now)
+
+
+class ReminderScheduler:
+    """Min-heap of per-todo fire times driving a single one-shot job.
+
+    Each todo has at most one live entry; superseded heap items are skipped
+    lazily when popped, so schedule/discard stay O(log n).
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._fire_at = {}
+        self._job_queue = None
+        self._callback = None
+        self._job = None
+        self._armed_at = None
+
+    def __len__(self):
+        return len(self._fire_at)
+
+    def attach(self, job_queue, callback):
+        self._job_queue = job_queue
+        self._callback = callback
+        self._arm()
+
+    async def load(self, session):
+        now = datetime.now()
+        # Only todos with a pending reminder or a scheduled nudge; exhausted ones stay out
+        await self._push_matching(session, now, or_(
+            Todo.next_overdue_notify_at.isnot(None),
+            (Todo.reminder_sent == False) & (Todo.deadline > now)
+        ))
+
+    async def sync(self, session, horizon: timedelta):
+        """Pick up todos due within `horizon` that were written by other workers."""
+        now = datetime.now()
+        until = now + horizon
+        await self._push_matching(session, now, or_(
+            Todo.next_overdue_notify_at <= until,
+            (Todo.reminder_sent == False) & (Todo.remind_at <= until) & (Todo.deadline > now)
+        ))
+
+    async def _push_matching(self, session, now: datetime, condition):
+        todos = await session.stream_scalars(select(Todo).where(Todo.status == TodoStatus.ACTIVE, condition))
+        async for todo in todos:
+            self._push(todo.id, next_fire_at(todo, now))
+        self._arm()
+
+    def schedule(self, todo: Todo, now: datetime = None):
+        self._push(todo.id, next_fire_at(todo, now or datetime.now()))
+        self._arm()
+
+    def discard(self, todo_id: int):
+        self._fire_at.pop(todo_id, None)
+
+    def next_due(self):
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: datetime) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, todo_id = heapq.heappop(self._heap)
+            if self._fire_at.get(todo_id) == fire_at:
+                del self._fire_at[todo_id]
+                due.append((todo_id, fire_at))
+        return due
+
+    def rearm(self):
+        # Called from the fired job itself, which is already finished
+        self._job = None
+        self._armed_at = None
+        self._arm()
+
+    def _push(self, todo_id: int, fire_at):
+        if fire_at is None:
+            self.discard(todo_id)
+            return
+        if self._fire_at.get(todo_id) == fire_at:
+            return
+        self._fire_at[todo_id] = fire_at
+        heapq.heappush(self._heap, (fire_at, todo_id))
+
+    def _drop_stale(self):
+        while self._heap and self._fire_at.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def _arm(self):
+        if self._job_queue is None:
+            return
+        fire_at = self.next_due()
+        if fire_at is None or (self._armed_at is not None and self._armed_at <= fire_at):
+            return
+        if self._job is not None:
+            try:
+                self._job.schedule_removal()
+            except JobLookupError:
+                # The job already started and left the scheduler; it rearms when it finishes
+                pass
+        # JobQueue treats naive datetimes as UTC, while deadlines are local, so pass a delay
+        delay = max((fire_at - datetime.now()).total_seconds(), 0)
+        self._job = self._job_queue.run_once(self._callback, when=delay, name='reminders')
+        self._armed_at = fire_at
+
+
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,36 @@
+import asyncio
+import os
+import sys
+from collections import OrderedDict
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import models  # noqa: E402
+from todo_cache import todo_cache  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """Runs a coroutine function against a fresh SQLite file: database(main) -> main()'s result.
+
+    Every call gets its own event loop and engine, so the pool is disposed
+    before the loop closes. The file is kept between calls of one test.
+    """
+    path = tmp_path / 'todos.db'
+
+    def run(main):
+        async def wrapper():
+            models.init_db(f'sqlite:///{path}')
+            try:
+                await models.create_schema()
+                return await main()
+            finally:
+                await models.async_engine.dispose()
+        return asyncio.run(wrapper())
+
+    run.path = str(path)
+    # Ids restart in every file, so cached pages must not leak between tests
+    monkeypatch.setattr(todo_cache, '_entries', OrderedDict())
+    return run
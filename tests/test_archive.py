@@ -0,0 +1,54 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select
+
+from archive import archive_finished_todos
+from models import AsyncSession, Todo, ArchivedTodo, Importance, TodoStatus
+from test_query_plans import BASELINE_SCHEMA
+
+
+async def add_finished_todo(text: str) -> int:
+    async with AsyncSession() as session:
+        todo = Todo(user_id=1, text=text, importance=Importance.MEDIUM, status=TodoStatus.DONE,
+                    deadline=datetime.now() - timedelta(days=40))
+        session.add(todo)
+        await session.commit()
+        return todo.id
+
+
+async def archive_twice() -> tuple:
+    """Archive the newest todo, add another one, archive again: (ids, archived ids)."""
+    first = await add_finished_todo('first')
+    assert await archive_finished_todos(max_age=timedelta(days=30)) >= 1
+    second = await add_finished_todo('second')
+    assert await archive_finished_todos(max_age=timedelta(days=30)) == 1
+    async with AsyncSession() as session:
+        archived = (await session.scalars(select(ArchivedTodo.id).order_by(ArchivedTodo.id))).all()
+    return (first, second), archived
+
+
+def test_archived_id_is_not_reused(database):
+    (first, second), archived = database(archive_twice)
+    assert second > first
+    assert archived == [first, second]
+
+
+def test_migrated_database_does_not_reuse_archived_ids(database):
+    # A pre-migration database whose highest id was already archived once
+    with sqlite3.connect(database.path) as conn:
+        conn.execute(BASELINE_SCHEMA)
+        conn.execute("INSERT INTO todos (id, user_id, text, importance, deadline, status, reminder_sent, "
+                     "is_recurring) VALUES (3, 1, 'old', 'MEDIUM', '2024-01-15 12:00:00.000000', 'ACTIVE', 0, 0)")
+    engine = create_engine(f'sqlite:///{database.path}')
+    with engine.begin() as conn:
+        ArchivedTodo.__table__.create(conn)
+        conn.execute(insert(ArchivedTodo).values(id=7, user_id=1, text='archived earlier', status=TodoStatus.DONE))
+    engine.dispose()
+
+    (first, second), archived = database(archive_twice)
+    assert first > 7 and second > first
+    assert archived == [7, first, second]
+    with sqlite3.connect(database.path) as conn:
+        assert 'AUTOINCREMENT' in conn.execute("SELECT sql FROM sqlite_master WHERE name = 'todos'").fetchone()[0]
+        assert conn.execute("SELECT text FROM todos WHERE id = 3").fetchone() == ('old',)
@@ -0,0 +1,38 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from telegram.error import RetryAfter
+
+from delivery import DeliveryQueue
+from metrics import REMINDER_LAG
+
+
+class FlakyBot:
+    """Answers the first message with a 429, accepts the rest."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def send_message(self, **kwargs):
+        self.calls += 1
+        if self.calls == 1:
+            raise RetryAfter(1)
+
+
+def test_reminder_lag_includes_time_spent_retrying(monkeypatch):
+    monkeypatch.setattr(REMINDER_LAG, '_series', {})
+
+    async def main():
+        queue = DeliveryQueue(workers=1, rate=100, per_chat_interval=0)
+        await queue.start(FlakyBot())
+        queue.enqueue(chat_id=1, text='reminder', due_at=datetime.now() - timedelta(seconds=5))
+        queue.enqueue(chat_id=2, text='not a reminder')
+        while queue.sent < 2:
+            await asyncio.sleep(0.05)
+        await queue.stop()
+
+    asyncio.run(main())
+    (counts, total), = REMINDER_LAG._series.values()
+    # Observed once, after the 429 pause rather than at enqueue time
+    assert sum(counts) == 1
+    assert 6 <= total < 10
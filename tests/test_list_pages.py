@@ -0,0 +1,86 @@
+from datetime import datetime, time, timedelta
+from types import SimpleNamespace
+
+from list_handler import TodoListHandler
+from models import AsyncSession, Todo, Importance, RecurrencePattern
+
+
+async def seed():
+    today = datetime.combine(datetime.now().date(), time.min)
+    async with AsyncSession() as session:
+        session.add_all([
+            # Pending today plus seven more occurrences inside the /week window
+            Todo(user_id=1, text='daily', importance=Importance.MEDIUM, deadline=today + timedelta(minutes=1),
+                 is_recurring=True, recurrence_pattern=RecurrencePattern.DAILY),
+            Todo(user_id=1, text='one-off', importance=Importance.HIGH, deadline=today + timedelta(days=1, hours=12)),
+            Todo(user_id=1, text='one-off', importance=Importance.LOW, deadline=today + timedelta(days=3, hours=12)),
+            Todo(user_id=1, text='one-off', importance=Importance.MEDIUM, deadline=today + timedelta(days=6, hours=12)),
+        ])
+        await session.commit()
+
+
+def cursor(todo) -> tuple:
+    return todo.deadline, todo.importance, todo.id
+
+
+def test_week_pages_show_every_occurrence_once(database):
+    async def main():
+        await seed()
+        handler = TodoListHandler(page_size=5)
+        pages = []
+        todos, has_prev, has_next = await handler._fetch_page(1, days=7)
+        pages.append(todos)
+        while has_next:
+            todos, has_prev, has_next = await handler._fetch_page(1, 7, 'n', cursor(todos[-1]))
+            assert has_prev
+            pages.append(todos)
+
+        # Walking back from the last page gives the same pages again
+        back = [pages[-1]]
+        todos = pages[-1]
+        while len(back) < len(pages):
+            todos, has_prev, _ = await handler._fetch_page(1, 7, 'p', cursor(todos[0]))
+            back.insert(0, todos)
+        return pages, back
+
+    pages, back = database(main)
+    listed = [(todo.text, todo.deadline) for page in pages for todo in page]
+    assert [text for text, _ in listed].count('daily') == 8
+    assert len(listed) == 11 == len(set(listed))
+    assert [deadline for _, deadline in listed] == sorted(deadline for _, deadline in listed)
+    assert [[(todo.text, todo.deadline) for todo in page] for page in back] == \
+        [[(todo.text, todo.deadline) for todo in page] for page in pages]
+
+
+class FakeMessage:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, reply_markup=None):
+        self.replies.append(text)
+
+
+class FakeQuery:
+    def __init__(self):
+        self.message = FakeMessage()
+        self.edited = []
+
+    async def answer(self, text=None):
+        pass
+
+    async def edit_message_text(self, text, reply_markup=None):
+        self.edited.append(text)
+
+
+def test_details_leave_the_list_page_in_place(database):
+    async def main():
+        await seed()
+        todos, _, _ = await TodoListHandler()._fetch_page(1)
+        query = FakeQuery()
+        update = SimpleNamespace(callback_query=query, effective_user=SimpleNamespace(id=1))
+        await TodoListHandler().show_details(update, None, todos[1].id)
+        return query
+
+    query = database(main)
+    assert query.edited == []
+    assert len(query.message.replies) == 1 and query.message.replies[0].startswith('📌 Task: one-off')
@@ -0,0 +1,24 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from metrics import DB_LATENCY, instrument_engine
+
+
+def test_failed_statement_leaves_no_timing_state_on_the_connection(monkeypatch):
+    monkeypatch.setattr(DB_LATENCY, '_series', {})
+    engine = create_engine('sqlite://')
+    instrument_engine(engine)
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+        info = repr(conn.info)
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM missing'))
+            conn.rollback()
+        conn.execute(text('SELECT 1'))
+        assert repr(conn.info) == info
+    engine.dispose()
+
+    counts, _ = DB_LATENCY._series[('SELECT', '')]
+    assert sum(counts) == 2
@@ -0,0 +1,179 @@
+"""EXPLAIN QUERY PLAN checks: every hot query searches an index instead of scanning a table.
+
+The real code paths run against a SQLite file while their statements are
+captured; each captured SELECT is then explained with its own parameters.
+"""
+import re
+import sqlite3
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, event
+
+import models
+from models import AsyncSession, Todo, UserSettings, Importance, TodoStatus, RecurrencePattern
+from migrations import MIGRATIONS, upgrade
+
+TABLES = ('todos', 'todo_archive', 'user_settings')
+# Schema of todos.db before migrations existed
+BASELINE_SCHEMA = """
+CREATE TABLE todos (
+    id INTEGER NOT NULL,
+    user_id INTEGER,
+    text VARCHAR,
+    importance VARCHAR(6),
+    deadline DATETIME,
+    reminder_minutes INTEGER,
+    reminder_sent BOOLEAN,
+    status VARCHAR(6),
+    is_recurring BOOLEAN,
+    recurrence_pattern VARCHAR(7),
+    parent_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(parent_id) REFERENCES todos (id)
+)
+"""
+
+
+def explain(path: str, statement: str, parameters) -> list:
+    with sqlite3.connect(path) as conn:
+        return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+
+
+def capture_selects(database, main) -> list:
+    """(statement, parameters) of every SELECT main() runs."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    async def captured():
+        event.listen(models.async_engine.sync_engine, 'before_cursor_execute', before_cursor_execute)
+        await main()
+
+    database(captured)
+    assert statements, "nothing was queried"
+    return statements
+
+
+def assert_index_searches(database, statements, *indexes):
+    """Every table access in each plan is a SEARCH through one of `indexes`."""
+    for statement, parameters in statements:
+        plan = explain(database.path, statement, parameters)
+        accesses = [detail for detail in plan if re.match(rf'(SCAN|SEARCH) ({"|".join(TABLES)})\b', detail)]
+        assert accesses, f"no table access in plan {plan} for\n{statement}"
+        for detail in accesses:
+            assert re.match(rf'SEARCH \w+ USING (COVERING )?INDEX ({"|".join(indexes)}) ', detail), \
+                f"{detail!r} in plan {plan} for\n{statement}"
+
+
+async def seed():
+    now = datetime.now()
+    async with AsyncSession() as session:
+        session.add_all([
+            Todo(user_id=1, text='active', importance=Importance.HIGH, deadline=now + timedelta(hours=2)),
+            Todo(user_id=1, text='overdue', importance=Importance.LOW, deadline=now - timedelta(hours=1)),
+            Todo(user_id=1, text='series', importance=Importance.MEDIUM, deadline=now - timedelta(days=2),
+                 is_recurring=True, recurrence_pattern=RecurrencePattern.DAILY),
+            Todo(user_id=1, text='done', importance=Importance.MEDIUM, deadline=now - timedelta(days=40),
+                 status=TodoStatus.DONE),
+            UserSettings(user_id=1, briefing_time=datetime.min.time(), next_briefing_at=datetime.utcnow()),
+        ])
+        await session.commit()
+
+
+def test_list_pages_search_index(database):
+    from list_handler import TodoListHandler
+
+    async def main():
+        await seed()
+        handler = TodoListHandler(page_size=1)
+        todos, _, _ = await handler._fetch_page(1)
+        cursor = (todos[0].deadline, todos[0].importance, todos[0].id)
+        await handler._fetch_page(1, direction='n', cursor=cursor)
+        await handler._fetch_page(1, direction='p', cursor=cursor)
+        await handler._fetch_page(1, days=7)
+
+    assert_index_searches(database, capture_selects(database, main), 'ix_todos_user_status_deadline')
+
+
+def test_briefing_range_searches_index(database):
+    import bot
+    from leader import leader_lease
+
+    async def main():
+        await seed()
+        leader_lease.is_leader = True
+        try:
+            await bot.send_daily_todos(None)
+        finally:
+            leader_lease.is_leader = False
+
+    assert_index_searches(database, capture_selects(database, main),
+                          'ix_user_settings_next_briefing_at', 'ix_todos_user_status_deadline')
+
+
+def test_history_union_searches_both_tables(database):
+    from history_handler import TodoHistoryHandler
+
+    async def main():
+        await seed()
+        handler = TodoHistoryHandler()
+        for filter_type in ('done', 'week'):
+            rows, _ = await handler._fetch_page(1, filter_type)
+            await handler._fetch_page(1, filter_type, direction='o', cursor=(datetime.now(), 10))
+            await handler._fetch_page(1, filter_type, direction='n', cursor=(datetime.now() - timedelta(days=60), 0))
+
+    statements = capture_selects(database, main)
+    assert_index_searches(database, statements,
+                          'ix_todos_user_status_deadline', 'ix_todo_archive_user_status_deadline')
+    for statement, parameters in statements:
+        plan = ' '.join(explain(database.path, statement, parameters))
+        assert 'SEARCH todos' in plan and 'SEARCH todo_archive' in plan
+
+
+def test_scheduler_load_and_sync_search_index(database):
+    from reminder_scheduler import ReminderScheduler
+
+    async def main():
+        await seed()
+        scheduler = ReminderScheduler()
+        async with AsyncSession() as session:
+            await scheduler.load(session)
+            await scheduler.sync(session, timedelta(minutes=5))
+
+    assert_index_searches(database, capture_selects(database, main), 'ix_todos_status_next_overdue',
+                          'ix_todos_status_remind_at', 'ix_todos_status_deadline')
+
+
+def test_archive_select_searches_index(database):
+    from archive import archive_finished_todos
+
+    async def main():
+        await seed()
+        assert await archive_finished_todos(max_age=timedelta(days=30)) == 1
+
+    assert_index_searches(database, capture_selects(database, main), 'ix_todos_status_deadline')
+
+
+def test_upgrade_adds_indexes_to_baseline_database(tmp_path):
+    path = str(tmp_path / 'todos.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute(BASELINE_SCHEMA)
+        conn.execute("INSERT INTO todos (user_id, text, importance, deadline, reminder_minutes, reminder_sent, "
+                     "status, is_recurring) VALUES (1, 'old', 'MEDIUM', '2024-01-15 12:00:00.000000', 60, 0, "
+                     "'ACTIVE', 0)")
+
+    engine = create_engine(f'sqlite:///{path}')
+    with engine.begin() as conn:
+        upgrade(conn, models.Base.metadata)
+    engine.dispose()
+
+    with sqlite3.connect(path) as conn:
+        indexes = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        versions = {version for (version,) in conn.execute("SELECT version FROM schema_migrations")}
+        remind_at, = conn.execute("SELECT remind_at FROM todos").fetchone()
+    expected = {index.name for table in models.Base.metadata.tables.values() for index in table.indexes}
+    assert expected <= indexes
+    assert versions == {version for version, _, _ in MIGRATIONS}
+    assert remind_at.startswith('2024-01-15 11:00')
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+import bot
+from delivery import DeliveryQueue
+from models import AsyncSession, Todo, Importance
+from reminder_scheduler import ReminderScheduler
+
+
+def test_postponed_todo_does_not_fire_its_stale_reminder(database, monkeypatch):
+    scheduler = ReminderScheduler()
+    monkeypatch.setattr(bot, 'reminder_scheduler', scheduler)
+
+    async def main():
+        queue = DeliveryQueue()
+        monkeypatch.setattr(bot, 'delivery_queue', queue)
+        async with AsyncSession() as session:
+            todo = Todo(user_id=1, text='x', importance=Importance.MEDIUM,
+                        deadline=datetime.now() + timedelta(minutes=10), reminder_minutes=30)
+            session.add(todo)
+            await session.commit()
+            await scheduler.load(session)
+            # Another worker postpones the todo by a day after this one scheduled it
+            todo.set_deadline(todo.deadline + timedelta(days=1))
+            await session.commit()
+            remind_at = todo.remind_at
+
+        await bot.check_reminders(None)
+        async with AsyncSession() as session:
+            reminder_sent = await session.scalar(select(Todo.reminder_sent))
+        return queue.depth, reminder_sent, remind_at, scheduler.next_due()
+
+    depth, reminder_sent, remind_at, next_due = database(main)
+    assert depth == 0
+    assert reminder_sent is False
+    assert next_due == remind_at
@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta
+
+from models import Todo, Importance, RecurrencePattern
+from recurrence import Occurrence
+from todo_cache import TodoCache
+
+
+def test_find_todo_returns_the_series_row_for_an_occurrence():
+    cache = TodoCache(max_users=10)
+    series = Todo(id=5, user_id=1, text='daily', importance=Importance.MEDIUM, deadline=datetime.now(),
+                  recurrence_pattern=RecurrencePattern.DAILY)
+    # A later /week page holding only an expanded occurrence of the series
+    cache.put(1, ('page', 'later'), ([Occurrence(series, series.deadline + timedelta(days=1))], False, True),
+              cache.version(1))
+
+    todo = cache.find_todo(1, 5)
+    assert todo is series
+    todo.text = 'renamed'
+    assert series.text == 'renamed'
@@ -0,0 +1,112 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from webhook import WebhookServer
+
+UPDATE = b'{"update_id": 1, "message": {"message_id": 1, "date": 0, "chat": {"id": 5, "type": "private"}, "text": "hi"}}'
+
+
+@pytest.fixture
+def server():
+    application = SimpleNamespace(bot=None, update_queue=asyncio.Queue(maxsize=1))
+    return WebhookServer(application, path='/telegram', secret_token=None)
+
+
+def test_accepts_update_object(server):
+    assert server._accept('POST', '/telegram', {}, UPDATE) == 200
+    assert server.application.update_queue.get_nowait().update_id == 1
+
+
+@pytest.mark.parametrize('body', [b'null', b'[]', b'[{"update_id": 1}]', b'"update"', b'42', b'{', b'',
+                                  b'{"update_id": 1, "message": 5}', b'{"update_id": 1, "message": [1]}'])
+def test_rejects_bodies_that_are_not_update_objects(server, body):
+    assert server._accept('POST', '/telegram', {}, body) == 400
+    assert server.application.update_queue.empty()
+
+
+def post(body: bytes, secret: str = None, connection: str = 'keep-alive') -> bytes:
+    headers = f'POST /telegram HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Length: {len(body)}\r\nConnection: {connection}\r\n'
+    if secret is not None:
+        headers += f'X-Telegram-Bot-Api-Secret-Token: {secret}\r\n'
+    return headers.encode() + b'\r\n' + body
+
+
+async def read_response(reader: asyncio.StreamReader) -> tuple:
+    """(status, headers) of one response; the server never sends a body."""
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    headers = dict(line.lower().split(': ', 1) for line in head[1:] if line)
+    return int(head[0].split(' ')[1]), headers
+
+
+def serve(server, main):
+    """Run main(host, port) against the server listening on a free local port."""
+    async def run():
+        server.host, server.port = '127.0.0.1', 0
+        await server.start()
+        try:
+            return await main(server.host, server.port)
+        finally:
+            await server.stop()
+
+    return asyncio.run(run())
+
+
+async def exchange(host: str, port: int, *requests: bytes) -> list:
+    """Send requests one after another on a single connection and collect the responses."""
+    reader, writer = await asyncio.open_connection(host, port)
+    responses = []
+    try:
+        for request in requests:
+            writer.write(request)
+            await writer.drain()
+            responses.append(await read_response(reader))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return responses
+
+
+@pytest.mark.parametrize('secret', [None, '', 'wrong'])
+def test_wrong_or_missing_secret_answers_403(server, secret):
+    server.secret_token = 'right'
+
+    async def main(host, port):
+        return await exchange(host, port, post(UPDATE, secret, connection='close'))
+
+    [(status, _)] = serve(server, main)
+    assert status == 403
+    assert server.rejected == 1 and server.application.update_queue.empty()
+
+
+def test_matching_secret_is_accepted(server):
+    server.secret_token = 'right'
+
+    async def main(host, port):
+        return await exchange(host, port, post(UPDATE, 'right', connection='close'))
+
+    [(status, _)] = serve(server, main)
+    assert status == 200
+    assert server.application.update_queue.get_nowait().update_id == 1
+
+
+def test_keep_alive_serves_several_requests_on_one_connection(server):
+    server.application.update_queue = asyncio.Queue()
+
+    async def main(host, port):
+        return await exchange(host, port, post(UPDATE), post(UPDATE), post(UPDATE, connection='close'))
+
+    responses = serve(server, main)
+    assert [status for status, _ in responses] == [200, 200, 200]
+    assert [headers['connection'] for _, headers in responses] == ['keep-alive', 'keep-alive', 'close']
+    assert server.received == 3
+
+
+def test_full_queue_answers_503(server):
+    async def main(host, port):
+        return await exchange(host, port, post(UPDATE), post(UPDATE, connection='close'))
+
+    responses = serve(server, main)
+    assert [status for status, _ in responses] == [200, 503]
+    assert server.received == 1 and server.rejected == 1
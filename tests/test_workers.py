@@ -0,0 +1,78 @@
+"""Two worker processes against one SQLite file: one leader, and every reminder sent once."""
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from models import AsyncSession, Todo, Importance
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loads its reminder schedule, waits for "go" on stdin so both workers race, then
+# renews the lease and runs the reminder job once
+WORKER = """
+import asyncio, json, sys
+import models
+from bot import check_reminders
+from delivery import delivery_queue
+from leader import LeaderLease
+from reminder_scheduler import reminder_scheduler
+
+async def main():
+    models.init_db(sys.argv[1])
+    await models.create_schema()
+    async with models.AsyncSession() as session:
+        await reminder_scheduler.load(session)
+    print('ready', flush=True)
+    sys.stdin.readline()
+    leader = await LeaderLease(owner=sys.argv[2]).renew()
+    await check_reminders(None)
+    print(json.dumps({'leader': leader, 'sent': delivery_queue.depth}), flush=True)
+    await models.async_engine.dispose()
+
+asyncio.run(main())
+"""
+
+
+def run_workers(path: str, owners: tuple) -> list:
+    env = dict(os.environ, METRICS_PORT='0')
+    workers = [subprocess.Popen([sys.executable, '-c', WORKER, f'sqlite:///{path}', owner], cwd=ROOT, env=env,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True) for owner in owners]
+    for worker in workers:
+        assert worker.stdout.readline().strip() == 'ready'
+    for worker in workers:
+        worker.stdin.write('go\n')
+        worker.stdin.flush()
+    results = []
+    for worker in workers:
+        output, _ = worker.communicate(timeout=60)
+        assert worker.returncode == 0
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def test_two_workers_elect_one_leader_and_send_each_reminder_once(database):
+    async def seed():
+        now = datetime.now()
+        async with AsyncSession() as session:
+            # Reminders fall due 30 minutes before the deadline, so all three are due now
+            session.add_all([
+                Todo(user_id=user_id, text=f'todo {user_id}', importance=Importance.MEDIUM,
+                     deadline=now + timedelta(minutes=10), reminder_minutes=30)
+                for user_id in (1, 2, 3)
+            ])
+            await session.commit()
+
+    database(seed)
+    results = run_workers(database.path, ('worker-a', 'worker-b'))
+
+    assert sorted(result['leader'] for result in results) == [False, True]
+    assert sum(result['sent'] for result in results) == 3
+
+    async def reminders_sent():
+        async with AsyncSession() as session:
+            return (await session.scalars(select(Todo.reminder_sent))).all()
+
+    assert database(reminders_sent) == [True, True, True]
@@ -0,0 +1,118 @@
+import time
+from collections import OrderedDict
+from metrics import registry
+from recurrence import Occurrence
+from config import TODO_CACHE_MAX_USERS, TODO_CACHE_TTL, WORKERS
+
+
+class _UserEntry:
+    __slots__ = ('version', 'expires_at', 'results')
+
+    def __init__(self, version: int, ttl: float):
+        self.version = version
+        self.expires_at = time.monotonic() + ttl
+        self.results = {}
+
+
+class TodoCache:
+    """Per-user read-through cache of active todo queries.
+
+    Each user's entry holds the results of their recent list pages and
+    lookups. Any write for a user calls invalidate(), which drops the results
+    and bumps the entry version so reads that started before the write
+    cannot store stale rows. Entries expire after `ttl` seconds and the
+    least recently used user is evicted past `max_users`; 0 caches nothing.
+    Invalidation is local, so the cache is only correct while this worker is
+    the only one writing todos.
+    """
+
+    def __init__(self, max_users: int = TODO_CACHE_MAX_USERS, ttl: float = TODO_CACHE_TTL):
+        self.max_users = max_users
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def version(self, user_id: int) -> int:
+        entry = self._entries.get(user_id)
+        return entry.version if entry else 0
+
+    def get(self, user_id: int, key):
+        entry = self._live_entry(user_id)
+        if entry is None or key not in entry.results:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry.results[key]
+
+    def put(self, user_id: int, key, value, version: int):
+        entry = self._live_entry(user_id)
+        if entry is None:
+            if version != self.version(user_id):
+                return
+            entry = self._entries[user_id] = _UserEntry(version, self.ttl)
+            self._evict()
+        elif entry.version != version:
+            return
+        entry.results[key] = value
+
+    def find_todo(self, user_id: int, todo_id: int):
+        """Look a todo up in the user's cached results; each result's first item is a list of todos.
+
+        Pages hold expanded occurrences of recurring todos; for those the
+        series row itself is returned, never the read-only occurrence.
+        """
+        entry = self._live_entry(user_id)
+        if entry is not None:
+            for result in entry.results.values():
+                for todo in result[0]:
+                    if todo.id == todo_id:
+                        self.hits += 1
+                        return todo.series if isinstance(todo, Occurrence) else todo
+        self.misses += 1
+        return None
+
+    def invalidate(self, user_id: int):
+        entry = self._entries.get(user_id)
+        version = entry.version + 1 if entry else 1
+        self._entries[user_id] = _UserEntry(version, self.ttl)
+        self._entries.move_to_end(user_id)
+        self.invalidations += 1
+        self._evict()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'users': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'invalidations': self.invalidations,
+        }
+
+    def _live_entry(self, user_id: int):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            # Keep the version so in-flight reads from before a write stay rejected
+            self._entries[user_id] = _UserEntry(entry.version, self.ttl)
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    def _evict(self):
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+
+# Another worker's /done would leave this worker's pages stale for up to the TTL
+todo_cache = TodoCache(max_users=TODO_CACHE_MAX_USERS if WORKERS == 1 else 0)
+
+registry.callback('todo_bot_todo_cache_lookups_total', 'Todo cache lookups by result', lambda: {
+    (('result', 'hit'),): todo_cache.hits,
+    (('result', 'miss'),): todo_cache.misses,
+}, type='counter')
+registry.callback('todo_bot_todo_cache_invalidations_total', 'Todo cache invalidations',
+                  lambda: todo_cache.invalidations, type='counter')
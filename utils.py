@@ -1,11 +1,41 @@
-from datetime import timedelta
-from models import RecurrencePattern
+from datetime import datetime, timedelta, time, timezone
+from zoneinfo import ZoneInfo
+from models import UserSettings
+from config import BRIEFING_DEFAULT_TIME, DEFAULT_TIMEZONE
 
 
-def calculate_next_deadline(todo):
-    if todo.recurrence_pattern == RecurrencePattern.DAILY:
-        return todo.deadline + timedelta(days=1)
-    elif todo.recurrence_pattern == RecurrencePattern.WEEKLY:
-        return todo.deadline + timedelta(weeks=1)
-    elif todo.recurrence_pattern == RecurrencePattern.MONTHLY:
-        return todo.deadline + timedelta(days=30)
+def user_timezone(tz_name: str = None):
+    # Deadlines are naive server-local times, so a missing zone means the server's
+    return ZoneInfo(tz_name) if tz_name else datetime.now().astimezone().tzinfo
+
+
+def next_briefing_at(tz_name: str, briefing_time: time, now_utc: datetime) -> datetime:
+    """Next naive-UTC moment when briefing_time occurs in the user's zone."""
+    tz = user_timezone(tz_name)
+    local_now = now_utc.replace(tzinfo=timezone.utc).astimezone(tz)
+    candidate = datetime.combine(local_now.date(), briefing_time, tzinfo=tz)
+    if candidate <= local_now:
+        candidate = datetime.combine(local_now.date() + timedelta(days=1), briefing_time, tzinfo=tz)
+    return candidate.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_day_bounds(tz_name: str, now_utc: datetime) -> tuple[datetime, datetime]:
+    """Half-open server-local range covering the user's current calendar day."""
+    tz = user_timezone(tz_name)
+    day = now_utc.replace(tzinfo=timezone.utc).astimezone(tz).date()
+    start = datetime.combine(day, time.min, tzinfo=tz)
+    end = datetime.combine(day + timedelta(days=1), time.min, tzinfo=tz)
+    return start.astimezone().replace(tzinfo=None), end.astimezone().replace(tzinfo=None)
+
+
+async def ensure_user_settings(session, user_id: int):
+    """Create briefing settings with the defaults the first time a user adds a todo."""
+    if await session.get(UserSettings, user_id) is not None:
+        return
+    briefing_time = datetime.strptime(BRIEFING_DEFAULT_TIME, '%H:%M').time()
+    session.add(UserSettings(
+        user_id=user_id,
+        timezone=DEFAULT_TIMEZONE,
+        briefing_time=briefing_time,
+        next_briefing_at=next_briefing_at(DEFAULT_TIMEZONE, briefing_time, datetime.utcnow())
+    ))
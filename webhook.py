@@ -0,0 +1,150 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+from telegram import Update
+from metrics import registry
+from config import (WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET_TOKEN, WEBHOOK_URL,
+                    WEBHOOK_KEEPALIVE_TIMEOUT, WEBHOOK_MAX_BODY)
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 503: 'Service Unavailable'}
+
+
+class WebhookServer:
+    """Minimal HTTP/1.1 endpoint that feeds Telegram updates into the application.
+
+    Connections are kept alive between requests. Updates go into the
+    application's bounded update_queue, and a full queue answers 503 so
+    Telegram redelivers later instead of the process buffering without limit.
+    """
+
+    def __init__(self, application, host: str = WEBHOOK_LISTEN, port: int = WEBHOOK_PORT,
+                 path: str = WEBHOOK_PATH, secret_token: str = WEBHOOK_SECRET_TOKEN,
+                 keepalive_timeout: float = WEBHOOK_KEEPALIVE_TIMEOUT, max_body: int = WEBHOOK_MAX_BODY):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token
+        self.keepalive_timeout = keepalive_timeout
+        self.max_body = max_body
+        self._server = None
+        self._connections = {}
+        self.received = 0
+        self.rejected = 0
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Webhook listening on %s:%s%s", self.host, self.port, self.path)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            # Idle keep-alive connections would otherwise hold their handlers open
+            for writer in self._connections.values():
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), self.keepalive_timeout)
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    return
+                method, target, headers = self._parse_head(head)
+                length = int(headers.get('content-length', 0))
+                if length > self.max_body:
+                    await self._respond(writer, 413, keep_alive=False)
+                    return
+                body = await reader.readexactly(length) if length else b''
+
+                status = self._accept(method, target, headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._respond(writer, status, keep_alive)
+                if not keep_alive:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            return
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    def _parse_head(self, head: bytes):
+        lines = head.decode('latin-1').split('\r\n')
+        method, target, _ = lines[0].split(' ', 2)
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+        return method, target, headers
+
+    def _accept(self, method: str, target: str, headers: dict, body: bytes) -> int:
+        if target.split('?', 1)[0] != self.path:
+            return 404
+        if method != 'POST':
+            return 405
+        if self.secret_token and not hmac.compare_digest(headers.get(SECRET_HEADER, ''), self.secret_token):
+            self.rejected += 1
+            return 403
+        try:
+            data = json.loads(body)
+            # de_json returns None for null and fails on lists with AttributeError
+            if not isinstance(data, dict):
+                return 400
+            update = Update.de_json(data, self.application.bot)
+        except (ValueError, TypeError, KeyError, AttributeError):
+            return 400
+        try:
+            self.application.update_queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return 503
+        self.received += 1
+        return 200
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, keep_alive: bool):
+        connection = 'keep-alive' if keep_alive else 'close'
+        writer.write(
+            f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Length: 0\r\nConnection: {connection}\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+
+async def run_webhook(application, post_init=None, post_shutdown=None):
+    """Run the application on the webhook server until SIGINT/SIGTERM."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    server = WebhookServer(application)
+    registry.callback('todo_bot_webhook_updates_total', 'Webhook deliveries by result', lambda: {
+        (('result', 'accepted'),): server.received,
+        (('result', 'rejected'),): server.rejected,
+    }, type='counter')
+    async with application:
+        if post_init:
+            await post_init(application)
+        await application.start()
+        await server.start()
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET_TOKEN)
+        try:
+            await stop.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            if post_shutdown:
+                await post_shutdown(application)